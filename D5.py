@@ -1,7 +1,8 @@
-import os
 import subprocess
 import platform
 
+from Day_5_Complete import run_shell
+
 # -------------------------------
 # UAD class to interface with IP
 # -------------------------------
@@ -13,21 +14,23 @@ class Uad():
     # --- Common Channel ---
     def reset(self):
         cmd = f'{self.inst}.exe com --action reset' if self.is_windows else f'./{self.inst} com --action reset'
-        return os.system(cmd)
+        return run_shell(cmd)
 
     def enable(self):
         cmd = f'{self.inst}.exe com --action enable' if self.is_windows else f'./{self.inst} com --action enable'
-        return os.system(cmd)
+        return run_shell(cmd)
 
     def disable(self):
         cmd = f'{self.inst}.exe com --action disable' if self.is_windows else f'./{self.inst} com --action disable'
-        return os.system(cmd)
+        return run_shell(cmd)
 
     # --- Configuration Channel ---
     def read_CSR(self):
         cmd = f'{self.inst}.exe cfg --address 0x0' if self.is_windows else f'./{self.inst} cfg --address 0x0'
         try:
-            csr_bytes = subprocess.check_output(cmd, shell=True)
+            csr_bytes = run_shell(cmd, capture=True)
+            if csr_bytes is None:
+                return None
             return int(csr_bytes.strip(), 16)
         except subprocess.CalledProcessError:
             return None
@@ -36,7 +39,7 @@ class Uad():
 
     def write_CSR(self, value):
         cmd = f'{self.inst}.exe cfg --address 0x0 --data {hex(value)}' if self.is_windows else f'./{self.inst} cfg --address 0x0 --data {hex(value)}'
-        return os.system(cmd)
+        return run_shell(cmd)
 
     # --- HALT functions ---
     def halt(self):
@@ -49,7 +52,9 @@ class Uad():
     def drive_signal(self, value):
         cmd = f'{self.inst}.exe sig --data {hex(value)}' if self.is_windows else f'./{self.inst} sig --data {hex(value)}'
         try:
-            output = subprocess.check_output(cmd, shell=True)
+            output = run_shell(cmd, capture=True)
+            if output is None:
+                return None
             output = output.strip()
             if not output:
                 return None
@@ -1,8 +1,16 @@
 import os
+import signal
 import subprocess
 import shlex
 import csv
-import matplotlib.pyplot as plt
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import command_plan as cp
+import fir_log
+import stimulus
 
 #----------------------------------
 # Constants
@@ -12,62 +20,256 @@ COEF_ADDR = 0x4
 OUTCAP_ADDR = 0x8
 MAX_BUF = 255
 
+# CSR fields used by the testcases
+FEN = 1 << 0
+CEN_MASK = 0xF << 1     # C0EN-C3EN
+HALT = 1 << 5
+STS_MASK = 0x3 << 6
+IBCNT_MASK = 0xFF << 8
+IBOVF = 1 << 16
+IBCLR = 1 << 17
+TCLR = 1 << 18
+
+# Write-1-to-clear bits per register; they read back as 0 after a write
+W1C_BITS = {CSR_ADDR: IBCLR | TCLR}
+
+# Bits per register the unit itself changes (status, buffer count, overflow);
+# such a register is read again before a modify, never taken as last written
+VOLATILE_BITS = {CSR_ADDR: STS_MASK | IBCNT_MASK | IBOVF}
+
 UNITS = ["impl0", "impl1", "impl2", "impl3", "impl4", "impl5"]
 GOLDEN = "golden"
+TESTS = ["tc1", "tc2", "tc3", "tc4", "tc5"]
 
-UNIT_FOLDER = r"C:\Users\zhlee_t\Desktop\Git Project\day-5-final-project-LZH-Oppstar"
+UNIT_FOLDER = os.environ.get("FIR_UNIT_FOLDER", os.path.dirname(os.path.abspath(__file__)))
 CONFIG_FILE = "filter.cfg"
 VECTOR_FILE = "sqr.vec"
 POR_FILE = "por.csv"
 
+CMD_TIMEOUT = 10        # seconds a single unit command may take
+CMD_RETRIES = 2         # retries of an idempotent command after a timeout
+RETRY_BACKOFF = 0.5     # seconds before the first retry, doubled each time
+UNIT_TIMEOUT = 600      # watchdog budget for one testcase on one unit
+
+# Commands safe to send again after a timeout. A sample (sig) may already
+# have been shifted in before the kill, so it is never sent twice.
+IDEMPOTENT = ("com", "cfg")
+
+# Transport counters of the job the current thread is running, see job_metrics()
+METRICS = ContextVar("fir_metrics", default=None)
+
+# Units that kept hanging; every further command on them raises UnitHung
+QUARANTINED = set()
+
+# Per-unit watchdog deadlines (time.monotonic()), see watchdog()
+DEADLINES = {}
+
+# Record which CSR/config states each job exercises (see csr_coverage.py)
+COVERAGE = False
+
+# Screen TC5 with a short probe before the full drive (see screening.py)
+SCREENING = False
+
+# Transport observers, called as observer(unit, kind, *args) after every
+# successful com action ("reset", "enable", "disable"), register write
+# ("write", addr, data) and sample drive ("drive", sig_in)
+OBSERVERS = []
+OBSERVERS_LOCK = threading.Lock()   # worker threads add and remove theirs
+
+log = fir_log.log
+
+class UnitHung(Exception):
+    """
+    A unit stopped responding and has been quarantined.
+    """
+
 #----------------------------------
 # Helpers
 #----------------------------------
 
+def set_unit_folder(folder):
+    """
+    Point the helpers at another folder of unit executables and data files.
+    Also used as the worker initializer of the parallel runner.
+    """
+    global UNIT_FOLDER
+    UNIT_FOLDER = folder
+
 def get_unit_path(unit):
     """
     Returns the full path to the unit executable.
-    Checks for .exe or .bat files.
+    Checks for .exe or .bat files, then a bare executable (non-Windows builds).
+    Commands run from the executable's folder, so a unit that keeps its
+    .dat state next to it can be relocated (see scheduler.make_sandbox).
     """
     exe_path = os.path.join(UNIT_FOLDER, unit + ".exe")
     bat_path = os.path.join(UNIT_FOLDER, unit + ".bat")
+    bin_path = os.path.join(UNIT_FOLDER, unit)
     if os.path.exists(exe_path):
         return exe_path
     elif os.path.exists(bat_path):
         return bat_path
+    elif os.path.isfile(bin_path) and os.access(bin_path, os.X_OK):
+        return bin_path
     else:
         return None
 
+def kill_tree(proc):
+    """
+    Kill a unit process together with anything it spawned.
+    """
+    try:
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError):
+        proc.kill()
+    proc.communicate()
+
+@contextmanager
+def watchdog(unit, seconds):
+    """
+    Bound the total time of everything run on a unit inside the block.
+    Once the deadline passes the unit is quarantined.
+    """
+    DEADLINES[unit] = time.monotonic() + seconds
+    try:
+        yield
+    finally:
+        DEADLINES.pop(unit, None)
+
+@contextmanager
+def job_metrics():
+    """
+    Count the transport commands issued inside the block, on this thread
+    only. Yields the counters.
+    """
+    metrics = {"commands": 0, "timeouts": 0, "retries": 0, "planned": 0}
+    token = METRICS.set(metrics)
+    try:
+        yield metrics
+    finally:
+        METRICS.reset(token)
+
+def count(name, n=1):
+    metrics = METRICS.get()
+    if metrics is not None:
+        metrics[name] += n
+
+def run_shell(cmd, capture=False):
+    """
+    Run a shell command (the standalone D5/TC2 scripts); if it hangs past
+    CMD_TIMEOUT the whole process tree is killed and None is returned.
+    Returns the exit code, or the output when capture=True.
+    """
+    proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE if capture else None,
+                            start_new_session=os.name != "nt")
+    try:
+        output, _ = proc.communicate(timeout=CMD_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        kill_tree(proc)
+        log.error(f"'{cmd}' timed out after {CMD_TIMEOUT}s")
+        return None
+    if capture:
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+        return output
+    return proc.returncode
+
+def invoke(unit, path, args):
+    """
+    Run the unit executable with a timeout, in its own process group.
+    A command that times out is killed (whole tree); idempotent commands
+    are retried with backoff. Once retries run out (at once for sig), or
+    the unit's watchdog deadline passes, the unit is quarantined and
+    UnitHung is raised.
+    Returns (returncode, stdout).
+    """
+    if unit in QUARANTINED:
+        raise UnitHung(f"Unit {unit} is quarantined")
+
+    popen_args = {"start_new_session": True}
+    if os.name == "nt":
+        popen_args = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+
+    retries = CMD_RETRIES if args and args[0] in IDEMPOTENT else 0
+    for attempt in range(retries + 1):
+        timeout = CMD_TIMEOUT
+        if unit in DEADLINES:
+            timeout = min(timeout, DEADLINES[unit] - time.monotonic())
+            if timeout <= 0:
+                break
+
+        count("commands")
+        proc = subprocess.Popen([path] + args, stdout=subprocess.PIPE,
+                                cwd=os.path.dirname(path), **popen_args)
+        try:
+            out, _ = proc.communicate(timeout=timeout)
+            return proc.returncode, out.decode()
+        except subprocess.TimeoutExpired:
+            count("timeouts")
+            kill_tree(proc)
+            log.error(f"{unit} timed out after {timeout:.1f}s: {' '.join(args)}")
+
+        if attempt < retries:
+            count("retries")
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    QUARANTINED.add(unit)
+    raise UnitHung(f"Unit {unit} hung on: {' '.join(args)}")
+
+def observe(observer):
+    with OBSERVERS_LOCK:
+        OBSERVERS.append(observer)
+
+def unobserve(observer):
+    with OBSERVERS_LOCK:
+        OBSERVERS.remove(observer)
+
+def notify(unit, kind, *args):
+    with OBSERVERS_LOCK:
+        observers = list(OBSERVERS)
+    for observer in observers:
+        observer(unit, kind, *args)
+
 def run_cmd(unit, command):
     """
     Run a command on the unit executable.
     """
     path = get_unit_path(unit)
     if not path:
-        print(f"[ERROR] Unit executable not found: {unit}")
+        log.error(f"Unit executable not found: {unit}")
         return None
 
     full_cmd = [path] + shlex.split(command)
-    print(f"[{unit}] Running: {' '.join(full_cmd)}")
-    try:
-        subprocess.run(full_cmd, check=True)
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] Command failed: {e}")
+    log.debug("Running: %s", command, extra={"data": {"cmd": command}})
+    returncode, _ = invoke(unit, path, full_cmd[1:])
+    if returncode != 0:
+        log.error(f"Command failed: {' '.join(full_cmd)} returned {returncode}")
         return None
+    return True
 
 def read_reg(unit, addr):
     path = get_unit_path(unit)
     if not path:
         raise FileNotFoundError(f"Unit executable not found: {unit}")
 
-    out = subprocess.check_output([path, "cfg", "--address", hex(addr)]).decode().strip()
+    args = ["cfg", "--address", hex(addr)]
+    returncode, out = invoke(unit, path, args)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, [path] + args)
+    out = out.strip()
     if out == '':
         raise ValueError(f"No output from unit {unit} at address {hex(addr)}")
     return int(out, 0)
 
 def write_reg(unit, addr, data):
-    return run_cmd(unit, f"cfg --address {hex(addr)} --data {hex(data)}")
+    result = run_cmd(unit, f"cfg --address {hex(addr)} --data {hex(data)}")
+    if result:
+        notify(unit, "write", addr, data)
+    return result
 
 def drive_signal(unit, sig_in):
     """
@@ -75,28 +277,30 @@ def drive_signal(unit, sig_in):
     """
     path = get_unit_path(unit)
     if not path:
-        print(f"[ERROR] Unit executable missing: {unit}")
+        log.error(f"Unit executable missing: {unit}")
         return None
 
-    try:
-        out = subprocess.check_output([path, "sig", "--data", hex(sig_in)]).decode().strip()
-        if out == '':
-            print(f"[WARNING] No output from unit {unit} for input {sig_in}")
-            return None
-        return int(out, 0)
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] Signal command failed for input {sig_in}: {e}")
+    returncode, out = invoke(unit, path, ["sig", "--data", hex(sig_in)])
+    if returncode != 0:
+        log.error(f"Signal command failed for input {sig_in}: returned {returncode}")
         return None
+    out = out.strip()
+    if out == '':
+        log.warning(f"No output from unit {unit} for input {sig_in}")
+        return None
+    notify(unit, "drive", sig_in)
+    return int(out, 0)
 
-def load_coeffs(unit, cfg_file):
+def read_coeffs(cfg_file):
     """
-    Load filter coefficients from CSV.
+    Read filter coefficients from CSV.
     CSV format: coef,value,en
+    Returns (coefs, enables), or None if the file is missing.
     """
     cfg_path = os.path.join(UNIT_FOLDER, cfg_file)
     if not os.path.exists(cfg_path):
-        print(f"[ERROR] Configuration file missing: {cfg_file}")
-        return
+        log.error(f"Configuration file missing: {cfg_file}")
+        return None
 
     coefs = [0]*4
     enables = [0]*4
@@ -109,199 +313,461 @@ def load_coeffs(unit, cfg_file):
             en  = int(row["en"])
             coefs[idx] = val
             enables[idx] = en
+    return coefs, enables
+
+def coeff_ops(cfg_file):
+    """
+    Command plan loading the filter coefficients from CSV.
+    Raises FileNotFoundError if the file is missing.
+    """
+    cfg = read_coeffs(cfg_file)
+    if cfg is None:
+        raise FileNotFoundError(f"Configuration file missing: {cfg_file}")
+    coefs, enables = cfg
 
     # Pack coefficients into 32-bit register
     coef_reg = (coefs[3]<<24)|(coefs[2]<<16)|(coefs[1]<<8)|coefs[0]
-    write_reg(unit, COEF_ADDR, coef_reg)
 
     # Enable coefficients in CSR
-    csr = read_reg(unit, CSR_ADDR)
-    csr &= ~(0xF << 1)  # Clear C0EN-C3EN
-    csr |= (enables[0]<<1)|(enables[1]<<2)|(enables[2]<<3)|(enables[3]<<4)
-    write_reg(unit, CSR_ADDR, csr)
+    cen = (enables[0]<<1)|(enables[1]<<2)|(enables[2]<<3)|(enables[3]<<4)
+    return [cp.write(COEF_ADDR, coef_reg),
+            cp.read(CSR_ADDR),
+            cp.modify(CSR_ADDR, set_bits=cen, clear_bits=CEN_MASK)]
+
+def load_coeffs(unit, cfg_file):
+    """
+    Load filter coefficients from CSV into the unit.
+    """
+    run_plan(unit, coeff_ops(cfg_file), "load_coeffs")
+
+def load_por(por_file=POR_FILE):
+    """
+    Load POR reference values from CSV.
+    CSV format: register,value
+    """
+    por_path = os.path.join(UNIT_FOLDER, por_file)
+    por_values = {}
+    if os.path.exists(por_path):
+        with open(por_path) as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                por_values[row["register"]] = int(row["value"],0)
+    else:
+        log.warning(f"POR file missing: {por_file}")
+    return por_values
+
+def iter_vector(vec_file):
+    """
+    Lazily yield the input samples of a vector file (one sample per line)
+    or of a generated stimulus ("gen:..." spec, see stimulus.py).
+    Raises FileNotFoundError if the file is missing.
+    """
+    if stimulus.is_stimulus(vec_file):
+        return stimulus.generate(vec_file)
+    vec_path = os.path.join(UNIT_FOLDER, vec_file)
+    if not os.path.exists(vec_path):
+        raise FileNotFoundError(f"Vector file missing: {vec_file}")
+
+    def samples():
+        with open(vec_path) as f:
+            for line in f:
+                if line.strip():
+                    yield int(line.strip(), 0)
+    return samples()
+
+def read_vector(vec_file):
+    """
+    Read all input samples of a vector file or stimulus into a list.
+    Raises FileNotFoundError if the file is missing.
+    """
+    return list(iter_vector(vec_file))
+
+# Back to the POR state with the IP enabled
+RESTART = (cp.reset(), cp.enable())
+
+def reset_unit(unit):
+    """
+    Bring a unit back to its POR state with the IP enabled.
+    """
+    run_plan(unit, RESTART, "reset")
 
 #----------------------------------
-# Testcases
+# Command plans
 #----------------------------------
 
-def tc1_global_enable_disable(unit):
-    print(f"\n[{unit}] TC1: Global enable/disable")
-    run_cmd(unit, "com --action disable")
+def read_observed(unit, addr):
+    """
+    Register read whose failure is a result, not an error.
+    Returns (value, None), or (None, reason) if unreadable.
+    """
     try:
-        read_reg(unit, CSR_ADDR)
-        print("FAIL: CSR accessible when disabled")
-    except Exception:
-        print("PASS: CSR inaccessible when disabled")
-    run_cmd(unit, "com --action enable")
-
-def tc2_por(unit, por_values):
-    print(f"\n[{unit}] TC2: POR register values")
-    run_cmd(unit, "com --action reset")
+        return read_reg(unit, addr), None
+    except UnitHung:
+        raise
+    except Exception as e:
+        log.debug(f"Read of {hex(addr)} failed: {e}")
+        return None, str(e)
+
+def run_plan(unit, ops, name):
+    """
+    Compile a command plan (see command_plan.py) and run it on the unit.
+    Logs the command count before and after optimization.
+    Returns the values observed under the plan's keys; a read that failed
+    observes None and keeps its reason under ("error", key).
+    """
+    naive = cp.explicit_reads(ops, VOLATILE_BITS)
+    compiled = cp.compile_plan(ops, W1C_BITS, VOLATILE_BITS)
+    count("planned", cp.count(naive))   # up front, so an aborted plan still counts
+    results = {}
+    cache = {}          # last value of each register, as read or written
+    streamed = 0
+    for op in compiled:
+        kind = op[0]
+        if kind in cp.INVALIDATES:
+            cache.clear()
+        if kind in cp.COM_OPS:
+            if run_cmd(unit, f"com --action {kind}"):
+                notify(unit, kind)
+        elif kind == "read":
+            _, addr, key = op
+            if key is None:
+                cache[addr] = read_reg(unit, addr)
+            else:
+                value, reason = read_observed(unit, addr)
+                results[key] = value
+                if value is None:
+                    results[("error", key)] = reason
+                    cache.pop(addr, None)
+                else:
+                    cache[addr] = value
+        elif kind in cp.REG_OPS:
+            addr = op[1]
+            if kind == "write":
+                value = op[2]
+            else:
+                if addr not in cache:
+                    # The plan's read was an observation that failed
+                    count("planned")
+                    cache[addr] = read_reg(unit, addr)
+                value = (cache[addr] & ~op[3]) | op[2]
+            if write_reg(unit, addr, value) and addr not in VOLATILE_BITS:
+                cache[addr] = value & ~W1C_BITS.get(addr, 0)
+            else:
+                cache.pop(addr, None)
+        elif kind == "drive":
+            out = drive_signal(unit, op[1])
+            if op[2] is not None:
+                results[op[2]] = out
+        elif kind == "stream":
+            out = results[op[2]] = []
+            for val in iter_vector(op[1]):
+                count("planned")
+                out.append(drive_signal(unit, val))
+            streamed += len(out)
+
+    before, after = cp.count(naive) + streamed, cp.count(compiled) + streamed
+    log.info(f"[PLAN] {name}: {before} -> {after} commands")
+    return results
+
+#----------------------------------
+# Register model
+#----------------------------------
+
+class Csr():
+    def __init__(self, csr_bin):
+        self.fen = (csr_bin >> 0) & 0x1
+        self.c0en = (csr_bin >> 1) & 0x1
+        self.c1en = (csr_bin >> 2) & 0x1
+        self.c2en = (csr_bin >> 3) & 0x1
+        self.c3en = (csr_bin >> 4) & 0x1
+        self.halt = (csr_bin >> 5) & 0x1
+        self.sts = (csr_bin >> 6) & 0x3
+        self.ibcnt = (csr_bin >> 8) & 0xff
+        self.ibovf = (csr_bin >> 16) & 0x1
+        self.ibclr = (csr_bin >> 17) & 0x1
+        self.tclr = (csr_bin >> 18) & 0x1
+        self.rnd = (csr_bin >> 19) & 0x3
+        self.icoef = (csr_bin >> 21) & 0x1
+        self.icap = (csr_bin >> 22) & 0x1
+        self.rsvd = (csr_bin >> 23) & 0xffff
+
+    def encode(self):
+        return (
+            ((self.fen & 0x1) << 0) |
+            ((self.c0en & 0x1) << 1) |
+            ((self.c1en & 0x1) << 2) |
+            ((self.c2en & 0x1) << 3) |
+            ((self.c3en & 0x1) << 4) |
+            ((self.halt & 0x1) << 5) |
+            ((self.sts & 0x3) << 6) |
+            ((self.ibcnt & 0xff) << 8) |
+            ((self.ibovf & 0x1) << 16) |
+            ((self.ibclr & 0x1) << 17) |
+            ((self.tclr & 0x1) << 18) |
+            ((self.rnd & 0x3) << 19) |
+            ((self.icoef & 0x1) << 21) |
+            ((self.icap & 0x1) << 22) |
+            ((self.rsvd & 0x3ff) << 23)
+        )
+    
+    def __str__(self):
+        str_rep = "CSR Register Content\n"
+        str_rep += f"fen   : {hex(self.fen)}\n"
+        str_rep += f"c0en  : {hex(self.c0en)}\n"
+        str_rep += f"c1en  : {hex(self.c1en)}\n"
+        str_rep += f"c2en  : {hex(self.c2en)}\n"
+        str_rep += f"c3en  : {hex(self.c3en)}\n"
+        str_rep += f"halt  : {hex(self.halt)}\n"
+        str_rep += f"sts   : {hex(self.sts)}\n"
+        str_rep += f"ibcnt : {hex(self.ibcnt)}\n"
+        str_rep += f"ibovf : {hex(self.ibovf)}\n"
+        str_rep += f"ibclr : {hex(self.ibclr)}\n"
+        str_rep += f"tclr  : {hex(self.tclr)}\n"
+        str_rep += f"rnd   : {hex(self.rnd)}\n"
+        str_rep += f"icoef : {hex(self.icoef)}\n"
+        str_rep += f"icap  : {hex(self.icap)}\n"
+        str_rep += f"rsvd  : {hex(self.rsvd)}"
+        return str_rep
+
+class Uad():
+    """
+    Object wrapper around the helpers above, bound to one unit.
+    """
+    def __init__(self, unit):
+        self.unit = unit
+        self.csr = None
+
+    def reset(self):
+        return run_cmd(self.unit, "com --action reset")
+
+    def enable(self):
+        return run_cmd(self.unit, "com --action enable")
+
+    def disable(self):
+        return run_cmd(self.unit, "com --action disable")
+
+    def drive_signal(self, sig_in):
+        return drive_signal(self.unit, sig_in)
+
+    def get_csr(self):
+        self.csr = Csr(read_reg(self.unit, CSR_ADDR))
+        return self.csr
+
+    def set_csr(self):
+        result = write_reg(self.unit, CSR_ADDR, self.csr.encode())
+        self.get_csr()
+        return result
+
+    def get_reg(self, reg_name):
+        if reg_name == 'csr':
+            return self.get_csr()
+
+def twos_comp(num):
+    return ((num & 0x7F) + (-128 if num >> 7 == 0x1 else 0)) / 64
+
+#----------------------------------
+# Testcases
+#----------------------------------
+
+def tc1_global_enable_disable(unit, setup=()):
+    """
+    setup: command plan run first (e.g. RESTART), compiled together with
+    the testcase's own plan. The same holds for every testcase below.
+    """
+    log.info("TC1: Global enable/disable")
+    results = run_plan(unit, [*setup,
+                              cp.disable(),
+                              cp.read(CSR_ADDR, "csr"),
+                              cp.enable()], "TC1")
+    if results["csr"] is not None:
+        log.info("FAIL: CSR accessible when disabled")
+        return False
+    log.info("PASS: CSR inaccessible when disabled")
+    return True
+
+def tc2_por(unit, por_values, setup=()):
+    log.info("TC2: POR register values")
+    addr_map = {"CSR":CSR_ADDR,"COEF":COEF_ADDR,"OUTCAP":OUTCAP_ADDR}
+    regs = [reg_name for reg_name in por_values if reg_name in addr_map]
+    results = run_plan(unit, [*setup, cp.reset()] +
+                       [cp.read(addr_map[reg_name], reg_name) for reg_name in regs], "TC2")
     success = True
-    for reg_name, expected in por_values.items():
-        addr_map = {"CSR":CSR_ADDR,"COEF":COEF_ADDR,"OUTCAP":OUTCAP_ADDR}
-        addr = addr_map.get(reg_name)
-        if addr is None:
-            continue
-        try:
-            val = read_reg(unit, addr)
-            if val != expected:
-                print(f"FAIL: {reg_name} expected {hex(expected)}, got {hex(val)}")
-                success = False
-        except Exception as e:
-            print(f"FAIL: Cannot read {reg_name}: {e}")
+    for reg_name in regs:
+        expected, val = por_values[reg_name], results[reg_name]
+        if val is None:
+            log.info(f"FAIL: Cannot read {reg_name}: {results[('error', reg_name)]}")
+            success = False
+        elif val != expected:
+            log.info(f"FAIL: {reg_name} expected {hex(expected)}, got {hex(val)}")
             success = False
     if success:
-        print("PASS: POR values match")
-
-def tc3_input_buffer(unit):
-    print(f"\n[{unit}] TC3: Input buffer overflow/clear")
-    csr = read_reg(unit, CSR_ADDR)
-    csr |= (1<<5)  # HALT
-    write_reg(unit, CSR_ADDR, csr)
+        log.info("PASS: POR values match")
+    return success
 
-    overflow_triggered = False
+def tc3_input_buffer(unit, setup=()):
+    log.info("TC3: Input buffer overflow/clear")
+    ops = [*setup, cp.read(CSR_ADDR), cp.modify(CSR_ADDR, set_bits=HALT)]
     for i in range(MAX_BUF+5):
-        drive_signal(unit, i)
-        csr = read_reg(unit, CSR_ADDR)
-        if csr & (1<<16):  # IBOVF
-            overflow_triggered = True
+        ops += [cp.drive(i), cp.read(CSR_ADDR, ("csr", i))]
+    # Clear buffer
+    ops += [cp.modify(CSR_ADDR, set_bits=IBCLR), cp.read(CSR_ADDR, "cleared")]
+    results = run_plan(unit, ops, "TC3")
 
+    for i in range(MAX_BUF+5):
+        log.debug("Sample %d -> CSR %s", i, results[("csr", i)],
+                  extra={"data": {"sample": i, "csr": results[("csr", i)]}})
+    overflow_triggered = any((results[("csr", i)] or 0) & IBOVF for i in range(MAX_BUF+5))
     if overflow_triggered:
-        print("PASS: Buffer overflow set")
+        log.info("PASS: Buffer overflow set")
     else:
-        print("FAIL: Buffer overflow not triggered")
+        log.info("FAIL: Buffer overflow not triggered")
 
-    # Clear buffer
-    csr |= (1<<17)
-    write_reg(unit, CSR_ADDR, csr)
-    csr = read_reg(unit, CSR_ADDR)
-    if (csr & 0xFF00)>>8 == 0:
-        print("PASS: Buffer cleared")
+    csr = results["cleared"]
+    cleared = csr is not None and (csr & 0xFF00)>>8 == 0
+    if cleared:
+        log.info("PASS: Buffer cleared")
     else:
-        print("FAIL: Buffer not cleared")
+        log.info("FAIL: Buffer not cleared")
+    return overflow_triggered and cleared
 
-def tc4_bypass(unit):
+def tc4_bypass(unit, setup=()):
     """
     Test Case 4: Filter bypassing.
     Output should match input exactly when the filter is in bypass mode.
     """
-    print(f"\n[{unit}] TC4: Bypass test")
-
-    # Ensure filter is not halted, enable FEN, clear input buffer
-    csr = read_reg(unit, CSR_ADDR)
-    csr &= ~(1<<5)        # Clear HALT
-    csr |= (1<<0)         # FEN = 1 (global filter enable)
-    csr |= (1<<17)        # IBCLR = 1 (clear input buffer)
-    write_reg(unit, CSR_ADDR, csr)
-
-    # Activate bypass: set C0EN-C3EN to 0 so all coefficients disabled
-    csr &= ~(0xF << 1)    # Clear C0EN-C3EN
-    write_reg(unit, CSR_ADDR, csr)
-
+    log.info("TC4: Bypass test")
     test_vals = [0x00, 0x01, 0x7F, 0x80, 0xFF]
+    results = run_plan(unit, [*setup,
+        # Ensure filter is not halted, enable FEN, clear input buffer
+        cp.read(CSR_ADDR),
+        cp.modify(CSR_ADDR, set_bits=FEN | IBCLR, clear_bits=HALT),
+        # Activate bypass: set C0EN-C3EN to 0 so all coefficients disabled
+        cp.modify(CSR_ADDR, clear_bits=CEN_MASK),
+    ] + [cp.drive(val, val) for val in test_vals], "TC4")
+
+    passed = True
     for val in test_vals:
-        out = drive_signal(unit, val)
-        if out == val:
-            print(f"Input {val:#04x} -> Output {out:#04x} [PASS]")
-        else:
-            print(f"Input {val:#04x} -> Output {out} [FAIL]")
+        out = results[val]
+        log.debug("Input %#04x -> Output %s", val, out, extra={"data": {"in": val, "out": out}})
+        if out != val:
+            log.info(f"FAIL: Input {val:#04x} -> Output {out}")
+            passed = False
+    return passed
 
 
-def tc5_signal_processing(unit, cfg_file, vec_file):
+def tc5_signal_processing(unit, cfg_file, vec_file, golden=None, sink=None, setup=()):
     """
     Test Case 5: Signal processing
     Ensures POR reset, halt, clear taps/buffer, load coefficients,
     then release HALT for filtering.
+    Traces are handed to the plot sink (if any) instead of being shown.
     """
-    print(f"\n[{unit}] TC5: Signal processing")
+    log.info(f"TC5: Signal processing ({cfg_file}, {vec_file})")
+    results = run_plan(unit, tc5_plan(cfg_file, vec_file, setup), "TC5")
+    sig_out = results["out"]
 
-    # 1. Reset and enable filter to POR state
-    run_cmd(unit, "com --action reset")
-    run_cmd(unit, "com --action enable")
+    # 6. Queue golden vs output overlay; rendering happens off-thread
+    if sink is not None and sig_out:
+        sink.submit(unit, read_vector(vec_file), sig_out if golden is None else golden, sig_out)
 
-    # 2. Halt filter, clear input buffer and taps
-    csr = read_reg(unit, CSR_ADDR)
-    csr |= (1 << 5)    # HALT
-    csr |= (1 << 17)   # IBCLR: clear input buffer
-    csr |= (1 << 18)   # TCLR: clear filter taps
-    write_reg(unit, CSR_ADDR, csr)
+    return sig_out
 
-    # 3. Load coefficients and enable bits from config
-    load_coeffs(unit, cfg_file)
 
-    # 4. Release HALT to start filtering
-    csr = read_reg(unit, CSR_ADDR)
-    csr &= ~(1 << 5)   # HALT = 0
-    write_reg(unit, CSR_ADDR, csr)
+def tc5_plan(cfg_file, vec_file, setup=()):
+    """
+    Command plan of TC5, the streamed output under the "out" key.
+    """
+    return [*setup, *tc5_prepare(cfg_file),
+        # 5. Drive input vector, streamed from the file or generator
+        cp.stream(vec_file, "out"),
+    ]
 
-    # 5. Drive input vector
-    sig_in = []
-    sig_out = []
-    vec_path = os.path.join(UNIT_FOLDER, vec_file)
-    if not os.path.exists(vec_path):
-        print(f"[ERROR] Vector file missing: {vec_file}")
-        return []
-
-    with open(vec_path) as f:
-        for line in f:
-            val = int(line.strip(), 0)
-            sig_in.append(val)
-            sig_out.append(drive_signal(unit, val))
-
-    # 6. Plot input vs output
-    plt.figure()
-    plt.plot(sig_in, label="Input", drawstyle="steps-post")
-    plt.plot(sig_out, label="Output", drawstyle="steps-post")
-    plt.xlabel("Sample")
-    plt.ylabel("Value")
-    plt.title(f"{unit} Filter Response")
-    plt.legend()
-    plt.grid(True)
-    plt.show()
 
-    return sig_out
+def tc5_prepare(cfg_file):
+    """
+    Steps 1-4 of TC5: POR state with cleared taps and buffer, the config's
+    coefficients loaded and the filter running.
+    """
+    return [
+        # 1. Reset and enable filter to POR state
+        *RESTART,
+        # 2. Halt filter, clear input buffer and taps
+        cp.read(CSR_ADDR),
+        cp.modify(CSR_ADDR, set_bits=HALT | IBCLR | TCLR),
+        # 3. Load coefficients and enable bits from config
+        *coeff_ops(cfg_file),
+        # 4. Release HALT to start filtering
+        cp.read(CSR_ADDR),
+        cp.modify(CSR_ADDR, clear_bits=HALT),
+    ]
+
+
+def run_tc5(unit, cfg_file, vec_file, golden, sink=None):
+    """
+    TC5 as run after the other testcases: restore the coefficients and CSR
+    left behind by the bypass test, then filter and compare with golden.
+    The plan compiler drops the restore, since TC5 resets the unit first.
+    Returns (passed, sig_out).
+    """
+    # Restore coefficients and CSR after bypass
+    restore = coeff_ops(cfg_file) + [cp.read(CSR_ADDR),
+                                     cp.modify(CSR_ADDR, clear_bits=HALT | IBCLR | TCLR)]
+
+    sig_out = tc5_signal_processing(unit, cfg_file, vec_file, golden=golden, sink=sink,
+                                    setup=restore)
+    if sig_out == golden:
+        log.info("TC5 PASS: Matches golden output")
+        return True, sig_out
+    log.info("TC5 FAIL: Output differs from golden")
+    return False, sig_out
 
 
 #----------------------------------
 # Main
 #----------------------------------
 
-def main():
-    # Load POR reference
-    por_path = os.path.join(UNIT_FOLDER, POR_FILE)
-    por_values = {}
-    if os.path.exists(por_path):
-        with open(por_path) as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                por_values[row["register"]] = int(row["value"],0)
-    else:
-        print(f"[WARNING] POR file missing: {POR_FILE}")
+def main(tests=TESTS, plot=True):
+    """
+    Run the selected testcases on every unit, one after the other.
+    numpy/matplotlib are only imported when TC5 runs with plotting on,
+    so TC1-TC4 runs (and every worker that only needs them) start fast.
+    The parallel/sharded runner lives in runner.py.
+    """
+    por_values = load_por()
+
+    sink = None
+    if plot and "tc5" in tests:
+        from plotting import PlotSink, PLOT_DIR
+        sink = PlotSink(os.path.join(UNIT_FOLDER, PLOT_DIR))
 
     # Golden output
-    golden_output = tc5_signal_processing(GOLDEN, CONFIG_FILE, VECTOR_FILE)
+    golden_output = None
+    if "tc5" in tests:
+        with fir_log.job(GOLDEN, "tc5"):
+            golden_output = tc5_signal_processing(GOLDEN, CONFIG_FILE, VECTOR_FILE, sink=sink)
 
     # Run all units
     for unit in UNITS:
-        print(f"\n================= VALIDATING {unit} =================")
-        tc1_global_enable_disable(unit)
-        tc2_por(unit, por_values)
-        tc3_input_buffer(unit)
-        tc4_bypass(unit)
-        
-        # Restore coefficients and CSR after bypass
-        load_coeffs(unit, CONFIG_FILE)
-        csr = read_reg(unit, CSR_ADDR)
-        csr &= ~( (1<<5) | (1<<17) | (1<<18) )  # clear HALT, IBCLR, TCLR
-        write_reg(unit, CSR_ADDR, csr)
-        
-        sig_out = tc5_signal_processing(unit, CONFIG_FILE, VECTOR_FILE)
-        if sig_out == golden_output:
-            print(f"[{unit}] TC5 PASS: Matches golden output")
-        else:
-            print(f"[{unit}] TC5 FAIL: Output differs from golden")
+        log.info(f"================= VALIDATING {unit} =================")
+        for test in tests:
+            with fir_log.job(unit, test):
+                if test == "tc1":
+                    tc1_global_enable_disable(unit)
+                elif test == "tc2":
+                    tc2_por(unit, por_values)
+                elif test == "tc3":
+                    tc3_input_buffer(unit)
+                elif test == "tc4":
+                    tc4_bypass(unit)
+                elif test == "tc5":
+                    run_tc5(unit, CONFIG_FILE, VECTOR_FILE, golden_output, sink=sink)
+
+    # Plots are rendered in the background; only wait for them at the end
+    if sink is not None:
+        for path in sink.close():
+            log.info(f"[PLOT] {path}")
 
 
 if __name__ == "__main__":
+    fir_log.setup(os.path.join(UNIT_FOLDER, fir_log.LOG_DIR))
     main()
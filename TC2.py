@@ -1,8 +1,9 @@
-import os
 import subprocess
 import platform
 import csv
 
+from Day_5_Complete import run_shell
+
 # -------------------------------
 # UAD class to interface with IP
 # -------------------------------
@@ -14,34 +15,38 @@ class Uad():
     # --- Common Channel ---
     def reset(self):
         cmd = f'{self.inst}.exe com --action reset' if self.is_windows else f'./{self.inst} com --action reset'
-        return os.system(cmd)
+        return run_shell(cmd)
 
     def enable(self):
         cmd = f'{self.inst}.exe com --action enable' if self.is_windows else f'./{self.inst} com --action enable'
-        return os.system(cmd)
+        return run_shell(cmd)
 
     def disable(self):
         cmd = f'{self.inst}.exe com --action disable' if self.is_windows else f'./{self.inst} com --action disable'
-        return os.system(cmd)
+        return run_shell(cmd)
 
     # --- Configuration Channel ---
     def read_CSR(self, address=0x0):
         cmd = f'{self.inst}.exe cfg --address {hex(address)}' if self.is_windows else f'./{self.inst} cfg --address {hex(address)}'
         try:
-            csr_bytes = subprocess.check_output(cmd, shell=True)
+            csr_bytes = run_shell(cmd, capture=True)
+            if csr_bytes is None:
+                return None
             return int(csr_bytes.strip(), 16)
         except (subprocess.CalledProcessError, ValueError):
             return None
 
     def write_CSR(self, value, address=0x0):
         cmd = f'{self.inst}.exe cfg --address {hex(address)} --data {hex(value)}' if self.is_windows else f'./{self.inst} cfg --address {hex(address)} --data {hex(value)}'
-        return os.system(cmd)
+        return run_shell(cmd)
 
     # --- Signal Channel ---
     def drive_signal(self, value):
         cmd = f'{self.inst}.exe sig --data {hex(value)}' if self.is_windows else f'./{self.inst} sig --data {hex(value)}'
         try:
-            output = subprocess.check_output(cmd, shell=True)
+            output = run_shell(cmd, capture=True)
+            if output is None:
+                return None
             output = output.strip()
             if not output:
                 return None
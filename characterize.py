@@ -0,0 +1,175 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+import Day_5_Complete as fir
+import runner
+import stimulus
+from fir_model import FRAC_BITS, tap_weights, to_signed
+
+#----------------------------------
+# Constants
+#----------------------------------
+IMPULSE = stimulus.canonical("gen:impulse,n=64,amp=1.0")
+CHIRP = stimulus.canonical("gen:chirp,n=1024,amp=0.9")
+CFG_PATTERN = "p*.cfg"
+REPORT_FILE = "characterization.json"
+
+IMPULSE_TOL = 0.02          # max |H_measured - H_theory| from the impulse
+CHIRP_TOL = 0.1             # max magnitude error from the chirp
+CHIRP_MIN_ENERGY = 0.1      # chirp bins below this share of the peak are ignored
+CHIRP_MARGIN = 0.01         # cycles/sample skipped at each end of the sweep
+MIN_GAIN = 0.05             # bins quieter than this skip the dB/phase errors
+
+#----------------------------------
+# Responses
+#----------------------------------
+
+def default_cfgs():
+    return sorted(os.path.basename(p) for p in glob.glob(os.path.join(fir.UNIT_FOLDER, CFG_PATTERN)))
+
+def as_real(rows):
+    """
+    Output lists to a (rows, samples) array of real values; missing -> NaN.
+    """
+    codes = np.array([[np.nan if v is None else v for v in row] for row in rows], dtype=float)
+    codes = np.where(codes >= 128, codes - 256, codes)
+    return codes / (1 << FRAC_BITS)
+
+def coefficients(cfg):
+    """
+    (coefs, enables) of a config; ValueError if it is missing or unreadable.
+    """
+    try:
+        coeffs = fir.read_coeffs(cfg)
+    except (KeyError, ValueError, IndexError) as e:
+        raise ValueError(f"Config file {cfg} is not a coef,value,en table: {e!r}")
+    if coeffs is None:
+        raise ValueError(f"Config file missing: {cfg}")
+    return coeffs
+
+def theoretical_response(cfgs, nfft):
+    """
+    H(e^jw) of the enabled coefficients of every config, one row per config.
+    """
+    weights = np.array([tap_weights(*coefficients(cfg)) for cfg in cfgs]) / (1 << FRAC_BITS)
+    return np.fft.rfft(weights, n=nfft, axis=1)
+
+def impulse_response(outputs):
+    """
+    Measured H from impulse outputs, all rows in one batched FFT.
+    """
+    amp = stimulus.describe(IMPULSE)["amp"]
+    return np.fft.rfft(as_real(outputs) / amp, axis=1)
+
+def chirp_response(outputs):
+    """
+    Measured |H| from chirp outputs, only where the chirp carries energy
+    (the sweep's start/end bins are dominated by the on/off transients).
+    Returns (|H| per row, bin mask).
+    """
+    spec = stimulus.describe(CHIRP)
+    x = to_signed(fir.read_vector(CHIRP)) / (1 << FRAC_BITS)
+    big_x = np.fft.rfft(x)
+    freqs = np.fft.rfftfreq(len(x))
+    mask = ((np.abs(big_x) >= CHIRP_MIN_ENERGY * np.abs(big_x).max())
+            & (freqs > spec["f0"] + CHIRP_MARGIN) & (freqs < spec["f1"] - CHIRP_MARGIN))
+    big_y = np.fft.rfft(as_real(outputs), axis=1)
+    return np.abs(big_y[:, mask]) / np.abs(big_x[mask]), mask
+
+def missing_output(output):
+    """
+    Why an output can't be characterized (None if every sample is there).
+    """
+    if not output:
+        return "no output"
+    n = sum(v is None for v in output)
+    return f"{n} output sample(s) missing" if n else None
+
+def compare(measured, theory):
+    """
+    Deviation metrics per row: max complex error, max dB and phase error
+    over bins with meaningful gain.
+    """
+    error = np.abs(measured - theory).max(axis=1)
+    loud = np.abs(theory) >= MIN_GAIN
+    with np.errstate(divide="ignore", invalid="ignore"):
+        db = np.abs(20 * np.log10(np.abs(measured) / np.abs(theory)))
+        phase = np.abs(np.angle(measured / theory, deg=True))
+    db = np.where(loud, db, 0).max(axis=1)
+    phase = np.where(loud, phase, 0).max(axis=1)
+    return error, db, phase
+
+#----------------------------------
+# Characterization
+#----------------------------------
+
+def characterize(units, cfgs, backend="serial", n_jobs=1, sandbox=False,
+                 impulse_tol=IMPULSE_TOL, chirp_tol=CHIRP_TOL):
+    """
+    Drive impulse and chirp stimuli through every unit (golden included)
+    for every config and compare the measured response with theory.
+    Returns one record per (unit, cfg).
+    """
+    for cfg in cfgs:
+        coefficients(cfg)       # fail before driving any unit
+    jobs = runner.build_matrix(units, ["tc5"], cfgs, [IMPULSE, CHIRP])
+    results, _, goldens = runner.run_matrix(jobs, backend=backend, n_jobs=n_jobs,
+                                            sandbox=sandbox, triage=False)
+    outputs = {(fir.GOLDEN, cfg, vec): out for (cfg, vec), out in goldens.items()}
+    outputs.update({(r["unit"], r["cfg"], r["vec"]): r.get("output") for r in results})
+    details = {(r["unit"], r["cfg"], r["vec"]): r.get("detail") for r in results if r["status"] == "error"}
+
+    # A failed sig leaves a None sample, which would turn every metric into
+    # NaN: such rows are reported as errors, not as deviations
+    keys = [(unit, cfg) for unit in [fir.GOLDEN] + list(units) for cfg in cfgs]
+    report = {}
+    for unit, cfg in keys:
+        for vec in (IMPULSE, CHIRP):
+            reason = details.get((unit, cfg, vec)) or missing_output(outputs.get((unit, cfg, vec)))
+            if reason and (unit, cfg) not in report:
+                report[(unit, cfg)] = {"unit": unit, "cfg": cfg, "flagged": False,
+                                       "error": f"{stimulus.describe(vec)['generator']}: {reason}"}
+    rows = [key for key in keys if key not in report]
+    if not rows:
+        return [report[key] for key in keys]
+    cfg_index = {cfg: k for k, cfg in enumerate(cfgs)}
+    which = [cfg_index[cfg] for _, cfg in rows]
+
+    n_imp = stimulus.length(IMPULSE)
+    h_imp = impulse_response([outputs[(u, c, IMPULSE)] for u, c in rows])
+    h_theory = theoretical_response(cfgs, n_imp)[which]
+    imp_error, db_error, phase_error = compare(h_imp, h_theory)
+
+    mag_chirp, mask = chirp_response([outputs[(u, c, CHIRP)] for u, c in rows])
+    chirp_theory = np.abs(theoretical_response(cfgs, stimulus.length(CHIRP))[which][:, mask])
+    chirp_error = np.abs(mag_chirp - chirp_theory).max(axis=1)
+
+    for k, (unit, cfg) in enumerate(rows):
+        flagged = not (imp_error[k] <= impulse_tol and chirp_error[k] <= chirp_tol)
+        report[(unit, cfg)] = {
+            "unit": unit, "cfg": cfg,
+            "impulse_error": round(float(imp_error[k]), 4),
+            "magnitude_error_db": round(float(db_error[k]), 2),
+            "phase_error_deg": round(float(phase_error[k]), 1),
+            "chirp_error": round(float(chirp_error[k]), 4),
+            "flagged": flagged,
+        }
+    return [report[key] for key in keys]
+
+def print_report(report):
+    print("\n================= FREQUENCY RESPONSE =================")
+    for r in report:
+        if r.get("error"):
+            print(f"{r['unit']:8} {r['cfg']:12} {'ERROR':8} {r['error']}")
+            continue
+        status = "DEVIATES" if r["flagged"] else "OK"
+        print(f"{r['unit']:8} {r['cfg']:12} {status:8} impulse err={r['impulse_error']:<7} "
+              f"|H| err={r['magnitude_error_db']}dB phase err={r['phase_error_deg']}deg "
+              f"chirp err={r['chirp_error']}")
+
+def write_report(report, path=None):
+    with open(path or os.path.join(fir.UNIT_FOLDER, REPORT_FILE), "w") as f:
+        json.dump(report, f, indent=1, allow_nan=False)
@@ -0,0 +1,204 @@
+#----------------------------------
+# Command plans
+#
+# A testcase is a list of ops (plain tuples) that compile_plan() optimizes
+# and Day_5_Complete.run_plan() executes:
+#   ("reset",) ("enable",) ("disable",)     common channel
+#   ("read", addr, key)                      key=None: only feeds a later modify
+#   ("write", addr, value)
+#   ("modify", addr, set_bits, clear_bits)   write over the last value read
+#                                            or written (explicit_reads())
+#   ("drive", value, key)                    one sample
+#   ("stream", vec_file, key)                every sample of a vector/stimulus
+# Reads and drives with a key are observations: their values are recorded
+# and never optimized away.
+#----------------------------------
+
+#----------------------------------
+# Constants
+#----------------------------------
+REG_MASK = 0xFFFFFFFF
+
+COM_OPS = ("reset", "enable", "disable")
+REG_OPS = ("write", "modify")
+
+# Ops after which the last register values are no longer known
+INVALIDATES = ("reset", "enable", "disable", "drive", "stream")
+
+#----------------------------------
+# Ops
+#----------------------------------
+
+def reset():
+    return ("reset",)
+
+def enable():
+    return ("enable",)
+
+def disable():
+    return ("disable",)
+
+def read(addr, key=None):
+    return ("read", addr, key)
+
+def write(addr, value):
+    return ("write", addr, value)
+
+def modify(addr, set_bits=0, clear_bits=0):
+    return ("modify", addr, set_bits, clear_bits)
+
+def drive(value, key=None):
+    return ("drive", value, key)
+
+def stream(vec_file, key):
+    return ("stream", vec_file, key)
+
+def is_observation(op):
+    return op[0] == "stream" or (op[0] in ("read", "drive") and op[2] is not None)
+
+def as_modify(op):
+    """
+    (set_bits, clear_bits) of a write or modify; a write clears everything.
+    """
+    return (op[2], REG_MASK) if op[0] == "write" else (op[2], op[3])
+
+def from_modify(addr, set_bits, clear_bits):
+    if clear_bits == REG_MASK:
+        return write(addr, set_bits)
+    return modify(addr, set_bits, clear_bits)
+
+def count(ops):
+    """
+    Unit commands a plan issues, streamed samples excluded.
+    """
+    return sum(1 for op in ops if op[0] != "stream")
+
+#----------------------------------
+# Compiler
+#----------------------------------
+
+def drop_dead(ops):
+    """
+    Backward pass: drop what a later reset makes unobservable (register
+    accesses and resets before another reset) and enable/disable ops
+    overridden by a later one, as long as nothing observes the unit between.
+    """
+    live = []
+    reset_ahead = False     # a reset follows before the next observation
+    com_ahead = False       # an enable/disable follows before the next access
+    for op in reversed(ops):
+        kind = op[0]
+        if is_observation(op):
+            reset_ahead = com_ahead = False
+        elif kind == "reset":
+            if reset_ahead:
+                continue
+            reset_ahead = True
+        elif kind in COM_OPS:
+            if com_ahead:
+                continue
+            com_ahead = True
+        else:
+            if reset_ahead:
+                continue
+            com_ahead = False   # register access depends on the global enable
+        live.append(op)
+    return live[::-1]
+
+def coalesce(ops, w1c, volatile):
+    """
+    Forward pass over the live ops:
+    - repeated reset/enable/disable are de-duplicated,
+    - feeding reads of a register whose last value is already held are skipped,
+    - a write/modify right after another one to the same register merges
+      into it; W1C bits of the first (w1c: addr -> mask) are kept so its
+      clear still happens,
+    - a write of the value the register is known to hold is dropped.
+    The last written value only stands in for a read on fully writable
+    registers: one with hardware-owned bits (volatile: addr -> mask) is
+    read again before every modify, and a modify is not merged into it.
+    """
+    out = []
+    cached = set()      # registers whose last value the executor holds
+    known = {}          # registers whose value is known here, at compile time
+    com = None          # global enable state, None after a reset
+    for op in ops:
+        kind = op[0]
+        if kind == "reset":
+            if out and out[-1][0] == "reset":
+                continue
+            com = None
+        elif kind in COM_OPS:
+            if com == (kind == "enable"):
+                continue
+            com = kind == "enable"
+
+        if kind in INVALIDATES:
+            cached.clear()
+            known.clear()
+        elif kind == "read":
+            addr, key = op[1], op[2]
+            if key is None and addr in cached:
+                continue
+            cached.add(addr)
+            known.pop(addr, None)
+        elif kind in REG_OPS:
+            addr = op[1]
+            mask = w1c.get(addr, 0)
+            writable = not volatile.get(addr, 0)
+            set_bits, clear_bits = as_modify(op)
+            if addr in known:
+                set_bits, clear_bits = (known[addr] & ~clear_bits) | set_bits, REG_MASK
+                if set_bits == known[addr] and not set_bits & mask:
+                    continue
+            prev = out[-1] if out else None
+            if (prev and prev[0] in REG_OPS and prev[1] == addr
+                    and (writable or clear_bits == REG_MASK)):
+                prev_set, prev_clear = as_modify(prev)
+                set_bits = (prev_set & ~clear_bits) | set_bits | (prev_set & mask)
+                clear_bits = prev_clear | (clear_bits & ~mask)
+                out.pop()
+            op = from_modify(addr, set_bits, clear_bits)
+            if writable:
+                cached.add(addr)
+            else:
+                cached.discard(addr)
+            if writable and clear_bits == REG_MASK:
+                known[addr] = set_bits & ~mask
+            else:
+                known.pop(addr, None)
+        out.append(op)
+    return out
+
+def explicit_reads(ops, volatile=None):
+    """
+    Put a feeding read before every modify of a register whose last value
+    the executor doesn't hold (nothing read or written since the last
+    reset/drive, or hardware-owned bits), so a plan lists every command
+    it sends.
+    """
+    volatile = volatile or {}
+    out = []
+    held = set()
+    for op in ops:
+        kind = op[0]
+        if kind in INVALIDATES:
+            held.clear()
+        elif kind == "read":
+            held.add(op[1])
+        elif kind in REG_OPS:
+            addr = op[1]
+            if kind == "modify" and addr not in held:
+                out.append(read(addr))
+            if volatile.get(addr, 0):
+                held.discard(addr)
+            else:
+                held.add(addr)
+        out.append(op)
+    return out
+
+def compile_plan(ops, w1c=None, volatile=None):
+    """
+    Optimized equivalent of a plan: same observations, fewer commands.
+    """
+    return explicit_reads(coalesce(drop_dead(list(ops)), w1c or {}, volatile or {}), volatile)
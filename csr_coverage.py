@@ -0,0 +1,294 @@
+import json
+import os
+
+import Day_5_Complete as fir
+import command_plan as cp
+from scheduler import job_label, spawn_estimate
+
+#----------------------------------
+# CSR/config coverage
+#
+# A Recorder models one unit's CSR, coefficient register and input buffer
+# from what is written and driven (the transport hooks in Day_5_Complete,
+# or a compiled command plan for predictions). Every write and drive
+# records the visited state as one packed integer:
+#
+#   bit 23..13  control: global enable, fen, c0en-c3en, halt, rnd, icoef, icap
+#   bit 12..11  input buffer: empty, partial, full, overflowed
+#   bit 10..3   coefficient class per tap: zero, positive, negative, extreme
+#   bit  2..0   input sample class (NO_SAMPLE for register writes)
+#
+# and every CSR write the control transition (before << 11 | after).
+#----------------------------------
+
+#----------------------------------
+# Constants
+#----------------------------------
+COVERAGE_FILE = "coverage.json"
+
+CTRL_BITS = 11
+NO_SAMPLE = 7
+TRANSITION = 1 << 24        # set on transitions when mixed with states
+
+# Field name -> (shift, width) in the packed state
+FIELDS = {
+    "en": (13, 1), "fen": (14, 1), "cen": (15, 4), "halt": (19, 1),
+    "rnd": (20, 2), "icoef": (22, 1), "icap": (23, 1),
+    "buffer": (11, 2),
+    "coef0": (3, 2), "coef1": (5, 2), "coef2": (7, 2), "coef3": (9, 2),
+    "sample": (0, 3),
+}
+
+#----------------------------------
+# State model
+#----------------------------------
+
+def coef_class(byte):
+    if byte == 0:
+        return 0
+    if byte in (0x7F, 0x80):
+        return 3
+    return 1 if byte < 0x80 else 2
+
+def sample_class(value):
+    """
+    zero, +small, +mid, +max, -max, -mid, -small (0..6).
+    """
+    value = (value & 0xFF) - 256 if value & 0x80 else value & 0xFF
+    if value == 0:
+        return 0
+    if value == 127:
+        return 3
+    if value == -128:
+        return 4
+    if value > 0:
+        return 1 if value < 16 else 2
+    return 6 if value > -16 else 5
+
+class Recorder():
+    """
+    Coverage of one unit; called like a transport observer and ignores
+    events for other units.
+    """
+    def __init__(self, unit, por_values):
+        self.unit = unit
+        self.por = por_values
+        self.states = set()
+        self.transitions = set()
+        self.enabled = True
+        self.reset()
+
+    def reset(self):
+        self.csr = self.por.get("CSR", 0)
+        self.coef = self.por.get("COEF", 0)
+        self.buffered = 0
+
+    def register(self, addr):
+        return {fir.CSR_ADDR: self.csr, fir.COEF_ADDR: self.coef}.get(addr, 0)
+
+    def ctrl(self):
+        csr = self.csr
+        return (int(self.enabled) | (csr & (fir.FEN | fir.CEN_MASK | fir.HALT)) << 1
+                | ((csr >> 19) & 0xF) << 7)
+
+    def state(self, sample):
+        if self.buffered == 0:
+            buffer = 0
+        elif self.buffered < fir.MAX_BUF:
+            buffer = 1
+        else:
+            buffer = 2 if self.buffered == fir.MAX_BUF else 3
+        coefs = 0
+        for k in range(4):
+            coefs |= coef_class((self.coef >> 8 * k) & 0xFF) << 2 * k
+        return self.ctrl() << 13 | buffer << 11 | coefs << 3 | sample
+
+    def __call__(self, unit, kind, *args):
+        if unit != self.unit:
+            return
+        if kind == "reset":
+            self.reset()
+        elif kind in ("enable", "disable"):
+            self.enabled = kind == "enable"
+        elif kind == "write":
+            addr, data = args
+            if addr == fir.CSR_ADDR:
+                before = self.ctrl()
+                if data & fir.IBCLR:
+                    self.buffered = 0
+                self.csr = data & ~(fir.IBCLR | fir.TCLR)
+                self.transitions.add(before << CTRL_BITS | self.ctrl())
+            elif addr == fir.COEF_ADDR:
+                self.coef = data
+            self.states.add(self.state(NO_SAMPLE))
+        elif kind == "drive":
+            self.states.add(self.state(sample_class(args[0])))
+            if self.csr & fir.HALT:
+                self.buffered = min(self.buffered + 1, fir.MAX_BUF + 1)
+
+    def index(self):
+        return {"states": sorted(self.states), "transitions": sorted(self.transitions)}
+
+def start(unit, por_values):
+    recorder = Recorder(unit, por_values)
+    fir.observe(recorder)
+    return recorder
+
+def stop(recorder):
+    fir.unobserve(recorder)
+
+def items(index):
+    """
+    States and transitions of an index as one set of integers.
+    """
+    return set(index["states"]) | {TRANSITION | t for t in index["transitions"]}
+
+#----------------------------------
+# Prediction and pruning
+#----------------------------------
+
+def predict(job, por_values):
+    """
+    Coverage a TC5 job will record, from its compiled command plan alone
+    (no unit launched), for a unit that comes out of reset as in por.csv.
+    """
+    unit = job["unit"]
+    recorder = Recorder(unit, por_values)
+    for op in cp.compile_plan(fir.tc5_plan(job["cfg"], job["vec"]), fir.W1C_BITS, fir.VOLATILE_BITS):
+        kind = op[0]
+        if kind in cp.COM_OPS:
+            recorder(unit, kind)
+        elif kind == "write":
+            recorder(unit, "write", op[1], op[2])
+        elif kind == "modify":
+            recorder(unit, "write", op[1], (recorder.register(op[1]) & ~op[3]) | op[2])
+        elif kind == "drive":
+            recorder(unit, "drive", op[1])
+        elif kind == "stream":
+            for value in fir.iter_vector(op[1]):
+                recorder(unit, "drive", value)
+    return recorder.index()
+
+def covering(wanted, sources):
+    """
+    Names of the sources (name -> items) that together hold the wanted
+    items, largest contribution first.
+    """
+    left = set(wanted)
+    names = []
+    while left:
+        name = max(sources, key=lambda s: len(sources[s] & left), default=None)
+        if name is None or not sources[name] & left:
+            break
+        names.append(name)
+        left -= sources[name]
+    return names
+
+def prune(jobs, por_values, db=None):
+    """
+    Drop the TC5 jobs (config x vector and generated/fuzz stimuli) whose
+    predicted coverage adds nothing to what their unit already has in the
+    coverage DB and to the other jobs of the run.
+    Greedy set cover: jobs are kept by new states per launch until the
+    rest add none. TC1-TC4 check behavior, not states, and always stay.
+    Returns (kept, pruned), both in the original order; every pruned job
+    carries "covered_by": the kept job labels and/or the coverage file
+    that hold its states.
+    """
+    predicted = {}
+    for job in jobs:
+        if job["test"] == "tc5" and (job["cfg"], job["vec"]) not in predicted:
+            predicted[(job["cfg"], job["vec"])] = items(predict(job, por_values))
+
+    candidates = {}
+    for k, job in enumerate(jobs):
+        if job["test"] == "tc5":
+            candidates.setdefault(job["unit"], []).append(k)
+    keep = {k for k, job in enumerate(jobs) if job["test"] != "tc5"}
+    covered_by = {}
+    for unit, left in candidates.items():
+        recorded = db.items(unit) if db else set()
+        covered = set(recorded)
+        sources = {COVERAGE_FILE: recorded} if recorded else {}
+        while left:
+            gain = {k: len(predicted[(jobs[k]["cfg"], jobs[k]["vec"])] - covered) / spawn_estimate(jobs[k])
+                    for k in left}
+            best = max(left, key=lambda k: gain[k])
+            if not gain[best]:
+                break
+            keep.add(best)
+            covered |= predicted[(jobs[best]["cfg"], jobs[best]["vec"])]
+            sources[job_label(jobs[best])] = predicted[(jobs[best]["cfg"], jobs[best]["vec"])]
+            left.remove(best)
+        for k in left:
+            covered_by[k] = covering(predicted[(jobs[k]["cfg"], jobs[k]["vec"])], sources)
+    kept = [job for k, job in enumerate(jobs) if k in keep]
+    pruned = [dict(job, covered_by=covered_by[k]) for k, job in enumerate(jobs) if k not in keep]
+    return kept, pruned
+
+#----------------------------------
+# Database and report
+#----------------------------------
+
+class CoverageDB():
+    """
+    Per-unit union of the indexes of passing jobs, kept in coverage.json.
+    A failing job's states are not credited, so pruning against the DB
+    never skips the job that would show the failure again.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(fir.UNIT_FOLDER, COVERAGE_FILE)
+        self.units = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for unit, index in json.load(f).items():
+                    self.units[unit] = (set(index["states"]), set(index["transitions"]))
+
+    def items(self, unit):
+        """
+        Recorded states and transitions of a unit, as items() gives them.
+        """
+        states, transitions = self.units.get(unit, ((), ()))
+        return items({"states": states, "transitions": transitions})
+
+    def add(self, results):
+        """
+        Merge the coverage of passing result records; returns new states
+        per unit.
+        """
+        new = {}
+        for r in results:
+            if "coverage" not in r or r["status"] != "pass":
+                continue
+            states, transitions = self.units.setdefault(r["unit"], (set(), set()))
+            added = set(r["coverage"]["states"]) - states
+            states |= added
+            transitions.update(r["coverage"]["transitions"])
+            new[r["unit"]] = new.get(r["unit"], 0) + len(added)
+        return new
+
+    def report(self):
+        """
+        Per unit: visited states and transitions, and for every field the
+        share of its values seen.
+        """
+        report = {}
+        for unit, (states, transitions) in sorted(self.units.items()):
+            fields = {}
+            for name, (shift, width) in FIELDS.items():
+                seen = {(s >> shift) & ((1 << width) - 1) for s in states}
+                fields[name] = round(len(seen) / (1 << width), 3)
+            report[unit] = {"states": len(states), "transitions": len(transitions), "fields": fields}
+        return report
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump({unit: {"states": sorted(states), "transitions": sorted(transitions)}
+                       for unit, (states, transitions) in sorted(self.units.items())}, f)
+
+def print_report(report, new=None):
+    print("\n================= CSR COVERAGE =================")
+    for unit, r in report.items():
+        fields = " ".join(f"{name}={share:.0%}" for name, share in r["fields"].items())
+        added = f" (+{new[unit]} new)" if new and unit in new else ""
+        print(f"{unit:8} states={r['states']}{added} transitions={r['transitions']}  {fields}")
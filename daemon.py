@@ -0,0 +1,334 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import Day_5_Complete as fir
+import fir_log
+import runner
+import stimulus
+from scheduler import job_label
+
+#----------------------------------
+# Constants
+#----------------------------------
+HOST = "127.0.0.1"          # local clients only
+PORT = 8765
+WATCH_INTERVAL = 1.0        # seconds between file checks
+DISPATCH_THREADS = 64       # jobs waiting on golden/worker results
+
+log = fir_log.log
+
+def warm_up():
+    """
+    No-op run once per pool worker at start-up so its process and imports
+    are ready before the first job arrives.
+    """
+    return os.getpid()
+
+def file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+#----------------------------------
+# Daemon
+#----------------------------------
+
+class Daemon():
+    """
+    Keeps a warm worker pool, the golden outputs and the latest result of
+    every job submitted so far. Every job runs on a sandbox copy of its
+    unit, so jobs never wait on each other except TC5 on its golden run.
+    The watcher re-runs only the jobs a changed file affects. A worker
+    process that dies breaks the whole pool; it is replaced (the pool
+    generation goes up) and the jobs it took down run once more.
+    """
+    def __init__(self, backend="process", n_jobs=None, log_queue=None):
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.backend = backend
+        self.log_queue = log_queue
+        self.pool = runner.make_executor(backend, self.n_jobs, log_queue)
+        self.pool_generation = 1
+        self.dispatch = ThreadPoolExecutor(max_workers=DISPATCH_THREADS)
+        self.lock = threading.Lock()
+        self.por_values = fir.load_por()
+        self.goldens = {}       # (cfg, vec) -> future of the golden job
+        self.jobs = {}          # label -> job, every job submitted so far
+        self.results = {}       # label -> latest result record
+        self.pending = {}       # label -> dispatch future
+        self.generation = {}    # label -> submission count; older runs are ignored
+        self.stamps = {}
+        self.stopping = threading.Event()
+        wait([self.pool.submit(warm_up) for _ in range(self.n_jobs)])
+
+    # --- Jobs ---
+    def submit(self, jobs):
+        """
+        Queue jobs (runner.build_matrix records); returns their labels at once.
+        """
+        labels = []
+        with self.lock:
+            for job in jobs:
+                label = job_label(job)
+                self.jobs[label] = job
+                gen = self.generation[label] = self.generation.get(label, 0) + 1
+                self.results[label] = dict(job, status="pending")
+                self.pending[label] = self.dispatch.submit(self.run, job, label, gen)
+                labels.append(label)
+            self.watch_paths()
+        return labels
+
+    def golden(self, cfg, vec):
+        """
+        Future of the golden run for (cfg, vec); a failed run is retried.
+        """
+        with self.lock:
+            future = self.goldens.get((cfg, vec))
+            if future is None or (future.done() and (future.exception()
+                                                      or future.result()["status"] != "pass")):
+                job = {"unit": fir.GOLDEN, "test": "golden", "cfg": cfg, "vec": vec}
+                future = self.goldens[(cfg, vec)] = self.pool.submit(
+                    runner.execute, job, self.por_values, None, sandbox=True)
+        return future
+
+    def restart_pool(self, broken):
+        """
+        Replace the pool of generation `broken`, unless another job already did.
+        """
+        with self.lock:
+            if self.pool_generation != broken:
+                return
+            log.error(f"[DAEMON] worker pool broken (generation {broken}), starting a new one")
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = runner.make_executor(self.backend, self.n_jobs, self.log_queue)
+            self.pool_generation += 1
+            for _ in range(self.n_jobs):
+                self.pool.submit(warm_up)
+
+    def run(self, job, label, gen):
+        try:
+            for attempt in range(2):
+                with self.lock:
+                    pool, pool_generation = self.pool, self.pool_generation
+                try:
+                    golden = None
+                    if job["test"] == "tc5":
+                        golden = self.golden(job["cfg"], job["vec"]).result().get("output")
+                    result = pool.submit(runner.execute, job, self.por_values, golden, sandbox=True).result()
+                    break
+                except BrokenProcessPool:
+                    self.restart_pool(pool_generation)
+                    if attempt:
+                        raise
+        except Exception as e:
+            log.error(f"[DAEMON] {label} raised: {e}")
+            result = dict(job, status="error", detail=str(e), seconds=0)
+        result["finished"] = time.time()
+        with self.lock:
+            if self.generation.get(label) == gen:
+                self.results[label] = result
+                self.pending.pop(label, None)
+        log.info(f"[DAEMON] {label}: {result['status']} in {result['seconds']}s")
+        return result
+
+    def wait(self, labels, timeout=None):
+        with self.lock:
+            futures = [self.pending[label] for label in labels if label in self.pending]
+        wait(futures, timeout=timeout)
+
+    def query(self, unit=None, test=None):
+        with self.lock:
+            return [r for label, r in sorted(self.results.items())
+                    if (unit is None or r["unit"] == unit) and (test is None or r["test"] == test)]
+
+    def status(self):
+        with self.lock:
+            return {"workers": self.n_jobs, "pool_generation": self.pool_generation,
+                    "jobs": len(self.jobs), "pending": len(self.pending),
+                    "goldens": len(self.goldens), "watched_files": len(self.stamps)}
+
+    # --- Watcher ---
+    def watched(self):
+        """
+        File -> labels of the jobs it affects, for every job submitted so far.
+        The golden executable affects every TC5 job; por.csv only TC2.
+        """
+        files = {}
+        def add(path, label):
+            if path:
+                files.setdefault(path, set()).add(label)
+        golden_exe = fir.get_unit_path(fir.GOLDEN)
+        for label, job in self.jobs.items():
+            add(fir.get_unit_path(job["unit"]), label)
+            if job["test"] == "tc2":
+                add(os.path.join(fir.UNIT_FOLDER, fir.POR_FILE), label)
+            if job["test"] == "tc5":
+                add(golden_exe, label)
+                add(os.path.join(fir.UNIT_FOLDER, job["cfg"]), label)
+                if not stimulus.is_stimulus(job["vec"]):
+                    add(os.path.join(fir.UNIT_FOLDER, job["vec"]), label)
+        return files
+
+    def watch_paths(self):
+        """
+        Start tracking files of new jobs (caller holds the lock).
+        """
+        for path in self.watched():
+            if path not in self.stamps:
+                self.stamps[path] = file_stamp(path)
+
+    def check_files(self):
+        """
+        Re-run the jobs affected by files changed since the last check.
+        Returns the re-submitted labels.
+        """
+        with self.lock:
+            files = self.watched()
+            changed = [path for path in files if file_stamp(path) != self.stamps.get(path)]
+            if not changed:
+                return []
+            for path in changed:
+                self.stamps[path] = file_stamp(path)
+                log.info(f"[DAEMON] changed: {path}")
+
+            por_path = os.path.join(fir.UNIT_FOLDER, fir.POR_FILE)
+            if por_path in changed:
+                self.por_values = fir.load_por()
+            golden_exe = fir.get_unit_path(fir.GOLDEN)
+            for cfg, vec in list(self.goldens):
+                paths = {golden_exe, os.path.join(fir.UNIT_FOLDER, cfg), os.path.join(fir.UNIT_FOLDER, vec)}
+                if paths.intersection(changed):
+                    del self.goldens[(cfg, vec)]
+            affected = sorted(set().union(*(files[path] for path in changed)))
+            jobs = [self.jobs[label] for label in affected]
+        return self.submit(jobs)
+
+    def watch(self, interval=WATCH_INTERVAL):
+        while not self.stopping.wait(interval):
+            try:
+                self.check_files()
+            except Exception as e:
+                log.error(f"[DAEMON] file check failed: {e}")
+
+    def close(self):
+        self.stopping.set()
+        self.dispatch.shutdown(wait=False, cancel_futures=True)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+#----------------------------------
+# HTTP API
+#
+#   POST /jobs      {"units": [...], "tests": [...], "cfg": [...], "vec": [...], "wait": false}
+#   GET  /results   ?unit=impl3&test=tc5
+#   GET  /status
+#   POST /shutdown
+#----------------------------------
+
+def make_handler(daemon):
+    class Handler(BaseHTTPRequestHandler):
+        def reply(self, code, body):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            log.debug(f"[DAEMON] {self.address_string()} {format % args}")
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path == "/results":
+                self.reply(200, daemon.query(query.get("unit"), query.get("test")))
+            elif url.path == "/status":
+                self.reply(200, daemon.status())
+            else:
+                self.reply(404, {"error": f"unknown path {url.path}"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path == "/shutdown":
+                self.reply(200, {"stopping": True})
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            if url.path != "/jobs":
+                self.reply(404, {"error": f"unknown path {url.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                jobs = parse_request(request)
+            except (ValueError, argparse.ArgumentTypeError) as e:
+                self.reply(400, {"error": str(e)})
+                return
+            labels = daemon.submit(jobs)
+            if request.get("wait"):
+                daemon.wait(labels)
+                with daemon.lock:
+                    self.reply(200, [daemon.results[label] for label in labels])
+            else:
+                self.reply(202, {"submitted": labels})
+    return Handler
+
+def string_list(request, key, default):
+    """
+    request[key] as a list of strings, or default if it is absent or empty.
+    """
+    value = request.get(key) or default
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"{key!r} must be a list of strings")
+    return value
+
+def parse_request(request):
+    """
+    Job request body -> matrix jobs, with the CLI defaults.
+    """
+    if not isinstance(request, dict):
+        raise ValueError("request body must be a JSON object")
+    units = string_list(request, "units", fir.UNITS)
+    tests = string_list(request, "tests", fir.TESTS)
+    cfgs = string_list(request, "cfg", [fir.CONFIG_FILE])
+    vecs = string_list(request, "vec", [fir.VECTOR_FILE])
+    for unit in units:
+        if unit not in fir.UNITS:
+            raise ValueError(f"Unknown unit {unit!r}")
+    for test in tests:
+        if test not in fir.TESTS:
+            raise ValueError(f"Unknown testcase {test!r}")
+    for vec in vecs:
+        if stimulus.is_stimulus(vec):
+            stimulus.parse_spec(vec)
+    # Same check as the CLI: a missing cfg/vec would drive nothing and pass
+    if "tc5" in tests:
+        for name in cfgs + vecs:
+            if not stimulus.is_stimulus(name) and not os.path.isfile(os.path.join(fir.UNIT_FOLDER, name)):
+                raise ValueError(f"File not found in {fir.UNIT_FOLDER}: {name}")
+    return runner.build_matrix(units, tests, cfgs, vecs)
+
+def serve(port=PORT, backend="process", n_jobs=None, watch_interval=WATCH_INTERVAL):
+    """
+    Run the daemon until POST /shutdown or Ctrl-C.
+    """
+    with fir_log.listening(backend == "process") as log_queue:
+        daemon = Daemon(backend, n_jobs, log_queue)
+        server = ThreadingHTTPServer((HOST, port), make_handler(daemon))
+        threading.Thread(target=daemon.watch, args=(watch_interval,), daemon=True).start()
+        log.info(f"[DAEMON] listening on http://{HOST}:{port} with {daemon.n_jobs} warm worker(s)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            daemon.close()
+    return 0
@@ -0,0 +1,180 @@
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+#----------------------------------
+# Constants
+#----------------------------------
+LOGGER = "fir"
+LOG_DIR = "logs"
+RUN_LOG = "run"             # file for records outside any unit/testcase
+FILE_BUFFER = 1 << 16       # bytes buffered per log file between writes
+
+# (unit, testcase) the current thread is working on, see job()
+JOB = ContextVar("fir_job", default=(None, None))
+
+log = logging.getLogger(LOGGER)
+
+# Handlers installed by setup(); the process backend feeds them from a queue
+HANDLERS = []
+
+#----------------------------------
+# Records
+#----------------------------------
+
+@contextmanager
+def job(unit, test):
+    """
+    Tag every record logged inside the block with the unit and testcase.
+    """
+    token = JOB.set((unit, test))
+    try:
+        yield
+    finally:
+        JOB.reset(token)
+
+class JobFilter(logging.Filter):
+    """
+    Stamp records with the current job. Records that already carry one
+    (sent by a worker process) keep it.
+    """
+    def filter(self, record):
+        if not hasattr(record, "unit"):
+            record.unit, record.test = JOB.get()
+        return True
+
+class ConsoleFilter(logging.Filter):
+    """
+    verbosity 0: run-level messages plus job warnings/errors,
+    1: job messages too, 2: every command and sample.
+    """
+    def __init__(self, verbosity):
+        super().__init__()
+        self.verbosity = verbosity
+
+    def filter(self, record):
+        if self.verbosity >= 2:
+            return True
+        if record.levelno < logging.INFO:
+            return False
+        return self.verbosity >= 1 or record.levelno >= logging.WARNING or not record.unit
+
+class JsonlFormatter(logging.Formatter):
+    """
+    One JSON object per record; fields passed as extra={"data": {...}} are
+    merged in.
+    """
+    def format(self, record):
+        entry = {"time": round(record.created, 6), "level": record.levelname,
+                 "unit": record.unit, "test": record.test, "msg": record.getMessage()}
+        entry.update(getattr(record, "data", None) or {})
+        return json.dumps(entry)
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        msg = record.getMessage()
+        if record.unit:
+            msg = f"[{record.unit}{' ' + record.test if record.test else ''}] {msg}"
+        if record.levelno >= logging.WARNING:
+            msg = f"[{record.levelname}] {msg}"
+        return msg
+
+class JobFileHandler(logging.Handler):
+    """
+    Buffered JSONL files, one per unit and testcase (<unit>_<test>.jsonl),
+    opened on their first record of the run.
+    """
+    def __init__(self, log_dir):
+        super().__init__(logging.DEBUG)
+        self.log_dir = log_dir
+        self.files = {}
+        self.setFormatter(JsonlFormatter())
+        self.addFilter(JobFilter())
+
+    def emit(self, record):
+        try:
+            name = "_".join(part for part in (record.unit, record.test) if part) or RUN_LOG
+            f = self.files.get(name)
+            if f is None:
+                os.makedirs(self.log_dir, exist_ok=True)
+                f = self.files[name] = open(os.path.join(self.log_dir, name + ".jsonl"), "w",
+                                            buffering=FILE_BUFFER)
+            f.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        with self.lock:
+            for f in self.files.values():
+                f.flush()
+
+    def close(self):
+        with self.lock:
+            for f in self.files.values():
+                f.close()
+            self.files = {}
+        super().close()
+
+#----------------------------------
+# Setup
+#----------------------------------
+
+def setup(log_dir, verbosity=0):
+    """
+    Log everything to per-unit/testcase JSONL files under log_dir and a
+    concise summary to the console.
+    """
+    for handler in HANDLERS:
+        log.removeHandler(handler)
+        handler.close()
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(ConsoleFormatter())
+    console.addFilter(JobFilter())
+    console.addFilter(ConsoleFilter(verbosity))
+
+    HANDLERS[:] = [JobFileHandler(log_dir), console]
+    for handler in HANDLERS:
+        log.addHandler(handler)
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+
+def worker(queue):
+    """
+    Worker side of the process backend: send every record to the parent.
+    """
+    for handler in list(log.handlers):
+        log.removeHandler(handler)   # inherited on fork; the parent owns the files
+    handler = QueueHandler(queue)
+    handler.addFilter(JobFilter())
+    log.addHandler(handler)
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+
+@contextmanager
+def listening(enabled=True):
+    """
+    Parent side of the process backend: yield the queue the workers log to
+    (None when disabled or logging is not set up) and write its records
+    with the local handlers until the block exits.
+    """
+    if not enabled or not HANDLERS:
+        yield None
+        return
+
+    # Forked workers must not inherit unwritten buffers
+    for handler in HANDLERS:
+        handler.flush()
+    queue = multiprocessing.Queue()
+    listener = QueueListener(queue, *HANDLERS, respect_handler_level=True)
+    listener.start()
+    try:
+        yield queue
+    finally:
+        listener.stop()
+        queue.close()
@@ -0,0 +1,76 @@
+import numpy as np
+
+#----------------------------------
+# Constants
+#----------------------------------
+# CSR.RND encodings from the HAS
+RND_MODES = {0: "round down", 1: "round up", 2: "round"}
+
+# OUTCAP POR values: HCAP = +1.0, LCAP = -1.0 in Q1.6
+POR_HCAP = 0x40
+POR_LCAP = 0xC0
+
+FRAC_BITS = 6
+
+#----------------------------------
+# Q1.6 helpers
+#----------------------------------
+
+def to_signed(codes):
+    """
+    8-bit codes (0..255) to signed integers (-128..127).
+    """
+    a = np.asarray(codes, dtype=np.int32)
+    return np.where(a >= 128, a - 256, a)
+
+def to_codes(values):
+    """
+    Signed integers back to 8-bit codes, wrapping like the hardware bus.
+    """
+    return (np.asarray(values, dtype=np.int32) & 0xFF).astype(np.uint8)
+
+def tap_weights(coefs, enables):
+    """
+    Signed tap weights (Q1.6 integers) with disabled taps zeroed.
+    """
+    return to_signed(coefs) * np.asarray(enables, dtype=np.int32)
+
+#----------------------------------
+# Reference model
+#----------------------------------
+
+def accumulate(sig_in, weights):
+    """
+    Full-precision FIR sums (Q2.12) with the taps cleared before sample 0.
+    Works on one vector or a batch of vectors (last axis = samples).
+    """
+    x = to_signed(sig_in)
+    n = x.shape[-1]
+    acc = np.zeros(x.shape, dtype=np.int32)
+    for k, w in enumerate(weights):
+        if w and k < n:
+            acc[..., k:] += int(w) * x[..., :n - k]
+    return acc
+
+def round_acc(acc, rnd):
+    """
+    Drop the extra fractional bits with the CSR.RND mechanism.
+    """
+    if rnd == 0:
+        return acc >> FRAC_BITS
+    if rnd == 1:
+        return -((-acc) >> FRAC_BITS)
+    return (acc + (1 << (FRAC_BITS - 1))) >> FRAC_BITS
+
+def simulate(sig_in, coefs, enables, rnd=2, hcap=POR_HCAP, lcap=POR_LCAP, overflow="cap"):
+    """
+    Expected 8-bit output codes for an input vector.
+    overflow: "cap" clamps to [LCAP, HCAP] as the HAS describes,
+    "saturate" clamps to the Q1.6 range, "wrap" keeps the low 8 bits.
+    """
+    y = round_acc(accumulate(sig_in, tap_weights(coefs, enables)), rnd)
+    if overflow == "cap":
+        y = np.clip(y, int(to_signed(lcap)), int(to_signed(hcap)))
+    elif overflow == "saturate":
+        y = np.clip(y, -128, 127)
+    return to_codes(y)
@@ -0,0 +1,39 @@
+import Day_5_Complete as fir
+
+#----------------------------------
+# Testcases as pytest tests; run with the pytest_fir plugin:
+#
+#   pytest -p pytest_fir fir_tests.py -n auto --junitxml=fir.xml
+#
+# The file is not named test_*.py on purpose: it drives the unit
+# executables, so it only runs when asked for by name.
+#----------------------------------
+
+def test_tc1_global_enable_disable(uad):
+    passed = fir.tc1_global_enable_disable(uad.unit, setup=fir.RESTART)
+    assert passed, "CSR accessible while the IP is disabled"
+
+def test_tc2_por(uad, por_values):
+    passed = fir.tc2_por(uad.unit, por_values)
+    assert passed, "register values after reset differ from por.csv"
+
+def test_tc3_input_buffer(uad):
+    passed = fir.tc3_input_buffer(uad.unit, setup=fir.RESTART)
+    assert passed, "input buffer overflow/clear failed"
+
+def test_tc4_bypass(uad):
+    passed = fir.tc4_bypass(uad.unit, setup=fir.RESTART)
+    assert passed, "bypassed output differs from input"
+
+def test_tc5_signal_processing(uad, cfg, vec, golden):
+    passed, sig_out = fir.run_tc5(uad.unit, cfg, vec, golden)
+    bad = [k for k, (g, o) in enumerate(zip(golden, sig_out)) if g != o]
+    first = f", first at sample {bad[0]}" if bad else ""
+    assert passed, (f"{len(bad)} of {len(golden)} samples differ from golden{first} "
+                    f"({len(sig_out)} samples returned)")
+
+def test_tc4_sends_planned_commands(uad):
+    with fir.job_metrics() as metrics:
+        fir.tc4_bypass(uad.unit, setup=fir.RESTART)
+    assert metrics["commands"] == metrics["planned"], (
+        f"{metrics['commands']} commands sent for {metrics['planned']} planned")
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+#----------------------------------
+# Constants
+#----------------------------------
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Import budget of a TC1-only run (every import it makes, incl. site)
+BUDGET_MS = 150
+
+# Modules a TC1-only run must never pull in
+HEAVY_MODULES = ["numpy", "matplotlib"]
+
+# A real TC1-only run, against a stub unit that answers every command with
+# 0x0, so imports deferred into the TC1 path are timed as well
+STUB_UNIT = "impl0"
+
+#----------------------------------
+# Helpers
+#----------------------------------
+
+def make_stub(folder):
+    """
+    Write the stub unit into folder.
+    """
+    if os.name == "nt":
+        path, body = os.path.join(folder, STUB_UNIT + ".bat"), "@echo 0x0\n"
+    else:
+        path, body = os.path.join(folder, STUB_UNIT), "#!/bin/sh\necho 0x0\n"
+    with open(path, "w") as f:
+        f.write(body)
+    os.chmod(path, 0o755)
+
+def tc1_entry(folder):
+    return ["final-project.py", "run", "--units", STUB_UNIT, "--tests", "tc1", "--no-plot",
+            "--folder", folder, "--out", os.path.join(folder, "results.json")]
+
+def measure_importtime(args):
+    """
+    Run python -X importtime and return (total_ms, imported module names,
+    exit code). Only top-level rows are summed; their cumulative column
+    already includes every nested import.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + args,
+                          cwd=HERE, capture_output=True, text=True, timeout=60)
+    total_us = 0
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append(name.strip())
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1000, modules, proc.returncode
+
+def check(args, budget_ms=BUDGET_MS):
+    """
+    Returns a list of problems; empty when the run is within budget.
+    """
+    total_ms, modules, returncode = measure_importtime(args)
+    problems = []
+    if returncode not in (0, 1):     # 1: the stub fails TC1, which is fine
+        problems.append(f"run exited with {returncode}")
+    for heavy in HEAVY_MODULES:
+        if heavy in modules:
+            problems.append(f"{heavy} imported by a TC1-only run")
+    if total_ms > budget_ms:
+        problems.append(f"imports took {total_ms:.1f} ms, over the budget of {budget_ms} ms")
+    print(f"[IMPORTTIME] {' '.join(args)}: {total_ms:.1f} ms (budget {budget_ms} ms)")
+    return problems
+
+#----------------------------------
+# Main
+#----------------------------------
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        make_stub(folder)
+        problems = check(tc1_entry(folder))
+    for p in problems:
+        print(f"FAIL: {p}")
+    if not problems:
+        print("PASS: TC1-only run within import budget")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
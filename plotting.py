@@ -0,0 +1,138 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+
+import fir_log
+
+#----------------------------------
+# Constants
+#----------------------------------
+PLOT_DIR = "plots"
+PLOT_FORMAT = "png"      # png or svg
+PLOT_WIDTH_PX = 1600     # one min/max bucket per horizontal pixel
+PLOT_WORKERS = 2
+
+log = fir_log.log
+
+#----------------------------------
+# Helpers
+#----------------------------------
+
+def to_samples(seq):
+    """
+    Convert a list of 8-bit samples into a float32 array of Q1.6 values.
+    Missing samples (None, or masked in a shared-memory view) become NaN
+    so they show up as gaps.
+    """
+    if np.ma.isMaskedArray(seq):
+        raw = seq.astype(np.float32).filled(np.nan)
+    else:
+        raw = np.asarray(seq, dtype=np.float32)
+    return np.where(raw >= 128, raw - 256, raw) / 64
+
+def decimate_minmax(y, width=PLOT_WIDTH_PX):
+    """
+    Reduce a trace to one (min, max) pair per pixel bucket.
+    Returns x, lo, hi. Traces shorter than two samples per pixel are
+    returned unchanged with lo == hi.
+    """
+    n = len(y)
+    if n <= 2 * width:
+        return np.arange(n), y, y
+
+    bucket = -(-n // width)
+    full = n // bucket
+    body = y[:full * bucket].reshape(full, bucket)
+    lo = np.fmin.reduce(body, axis=1)
+    hi = np.fmax.reduce(body, axis=1)
+    if full * bucket < n:
+        tail = y[full * bucket:]
+        lo = np.append(lo, np.fmin.reduce(tail))
+        hi = np.append(hi, np.fmax.reduce(tail))
+    x = np.arange(len(lo)) * bucket
+    return x, lo, hi
+
+def _draw_trace(ax, y, label, width):
+    x, lo, hi = decimate_minmax(y, width)
+    if lo is hi:
+        ax.plot(x, y, label=label, drawstyle="steps-post")
+    else:
+        ax.fill_between(x, lo, hi, step="post", alpha=0.5, label=label)
+
+def render_overlay(path, unit, sig_in, golden, impl, width=PLOT_WIDTH_PX):
+    """
+    Render golden vs impl (plus input) and a mismatch lane to an image.
+    Runs in a worker process; only the Agg/SVG canvases are used.
+    """
+    mismatch = (golden != impl) & ~(np.isnan(golden) & np.isnan(impl))
+
+    fig = Figure(figsize=(width / 100, 6), dpi=100)
+    ax, lane = fig.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [4, 1]})
+    _draw_trace(ax, sig_in, "Input", width)
+    _draw_trace(ax, golden, "Golden", width)
+    _draw_trace(ax, impl, unit, width)
+    ax.set_ylabel("Value (Q1.6)")
+    ax.set_title(f"{unit} vs golden ({int(mismatch.sum())} mismatching samples)")
+    ax.legend(loc="upper right")
+    ax.grid(True)
+
+    x, _, hi = decimate_minmax(mismatch.astype(np.float32), width)
+    lane.fill_between(x, 0, hi, step="post", color="tab:red")
+    lane.set_ylim(0, 1.1)
+    lane.set_yticks([])
+    lane.set_ylabel("Mismatch")
+    lane.set_xlabel("Sample")
+
+    fig.savefig(path)
+    return path
+
+#----------------------------------
+# Plot sink
+#----------------------------------
+
+class PlotSink():
+    """
+    Collects TC5 traces and renders them in a background process pool,
+    so validation never waits on matplotlib.
+    """
+    def __init__(self, out_dir=PLOT_DIR, fmt=PLOT_FORMAT, workers=PLOT_WORKERS):
+        self.out_dir = out_dir
+        self.fmt = fmt
+        # Spawned, not forked: traces arrive while the run still drives units
+        # from other threads, and a forked worker would inherit their pipes
+        self.pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        self.pending = []
+        os.makedirs(out_dir, exist_ok=True)
+
+    def submit(self, unit, sig_in, golden, impl, tag=""):
+        path = os.path.join(self.out_dir, f"{unit}{tag}.{self.fmt}")
+        fut = self.pool.submit(render_overlay, path, unit,
+                               to_samples(sig_in), to_samples(golden), to_samples(impl))
+        self.pending.append((unit, fut))
+        return fut
+
+    def close(self):
+        """
+        Wait for outstanding renders and return the written paths.
+        """
+        written = []
+        for unit, fut in self.pending:
+            try:
+                written.append(fut.result())
+            except Exception as e:
+                log.error(f"Plot for {unit} failed: {e}")
+        self.pending = []
+        self.pool.shutdown()
+        return written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,150 @@
+import os
+import shutil
+
+import pytest
+
+import Day_5_Complete as fir
+from scheduler import make_sandbox
+
+#----------------------------------
+# pytest plugin running the testcases as parametrized tests:
+#
+#   pytest -p pytest_fir fir_tests.py -n auto --junitxml=fir.xml
+#
+# Every unit gets a session-scoped Uad on a private sandbox copy of its
+# executable (one per xdist worker); its .dat state is snapshotted once and
+# restored before every test. Golden TC5 outputs are computed once per
+# session, on the xdist controller when the run is distributed.
+#----------------------------------
+
+#----------------------------------
+# Options
+#----------------------------------
+
+def pytest_addoption(parser):
+    group = parser.getgroup("fir", "FIR filter IP validation")
+    group.addoption("--fir-folder", default=fir.UNIT_FOLDER,
+                    help="folder with the unit executables and data files")
+    group.addoption("--fir-unit", action="append", choices=fir.UNITS,
+                    help="unit to validate, repeatable (default: all)")
+    group.addoption("--fir-cfg", action="append",
+                    help=f"coefficient config file for TC5, repeatable (default {fir.CONFIG_FILE})")
+    group.addoption("--fir-vec", action="append",
+                    help=f"vector file or gen: stimulus for TC5, repeatable (default {fir.VECTOR_FILE})")
+
+DEFAULTS = {"fir_unit": fir.UNITS, "fir_cfg": [fir.CONFIG_FILE], "fir_vec": [fir.VECTOR_FILE]}
+
+def option_list(config, name):
+    return config.getoption(name) or DEFAULTS[name]
+
+def pytest_configure(config):
+    fir.set_unit_folder(config.getoption("fir_folder"))
+
+def pytest_generate_tests(metafunc):
+    """
+    Units are session-scoped parameters so pytest groups the tests by unit
+    and builds each unit's fixture once.
+    """
+    config = metafunc.config
+    if "unit" in metafunc.fixturenames:
+        metafunc.parametrize("unit", option_list(config, "fir_unit"), scope="session")
+    if "cfg" in metafunc.fixturenames:
+        metafunc.parametrize("cfg", option_list(config, "fir_cfg"), scope="session")
+    if "vec" in metafunc.fixturenames:
+        metafunc.parametrize("vec", option_list(config, "fir_vec"), scope="session")
+
+#----------------------------------
+# Golden outputs
+#----------------------------------
+
+def compute_goldens(pairs):
+    """
+    Golden TC5 output for every (cfg, vec) pair, run on a sandbox copy.
+    """
+    unit, folder = make_sandbox(fir.GOLDEN)
+    try:
+        return {(cfg, vec): fir.tc5_signal_processing(unit, cfg, vec) for cfg, vec in pairs}
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def session_goldens(config):
+    """
+    (cfg, vec) -> golden output, computed at most once per process and
+    handed to xdist workers by the controller (see pytest_configure_node).
+    """
+    if not hasattr(config, "_fir_goldens"):
+        workerinput = getattr(config, "workerinput", None)
+        if workerinput is not None and "fir_goldens" in workerinput:
+            config._fir_goldens = {(cfg, vec): out for cfg, vec, out in workerinput["fir_goldens"]}
+        else:
+            pairs = [(cfg, vec) for cfg in option_list(config, "fir_cfg")
+                     for vec in option_list(config, "fir_vec")]
+            config._fir_goldens = compute_goldens(pairs)
+    return config._fir_goldens
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """
+    xdist controller: run golden once and ship the outputs to every worker.
+    """
+    goldens = session_goldens(node.config)
+    node.workerinput["fir_goldens"] = [[cfg, vec, out] for (cfg, vec), out in goldens.items()]
+
+#----------------------------------
+# Fixtures
+#----------------------------------
+
+@pytest.fixture(scope="session")
+def por_values():
+    return fir.load_por()
+
+@pytest.fixture(scope="session")
+def goldens(request):
+    return session_goldens(request.config)
+
+@pytest.fixture(scope="session")
+def golden(goldens, cfg, vec):
+    out = goldens.get((cfg, vec))
+    if not out:
+        pytest.fail(f"No golden output for {cfg} / {vec}")
+    return out
+
+@pytest.fixture(scope="session")
+def uad(unit):
+    """
+    Uad bound to a private copy of the unit (per xdist worker), with the
+    initial .dat state kept as uad.snapshot.
+    """
+    name, folder = make_sandbox(unit)
+    dat_path = name + ".dat"
+    uad = fir.Uad(name)
+    uad.dat_path = dat_path
+    uad.snapshot = None
+    if os.path.exists(dat_path):
+        with open(dat_path, "rb") as f:
+            uad.snapshot = f.read()
+    yield uad
+    shutil.rmtree(folder, ignore_errors=True)
+
+@pytest.fixture(autouse=True)
+def fir_unit_state(request):
+    """
+    Restore the unit's .dat snapshot before every test and bound the test
+    with the unit watchdog; the parameters become JUnit properties.
+    """
+    for name in ("unit", "cfg", "vec"):
+        if name in request.fixturenames:
+            request.node.user_properties.append((name, request.getfixturevalue(name)))
+    if "uad" not in request.fixturenames:
+        yield
+        return
+
+    uad = request.getfixturevalue("uad")
+    if uad.snapshot is None:
+        if os.path.exists(uad.dat_path):
+            os.remove(uad.dat_path)
+    else:
+        with open(uad.dat_path, "wb") as f:
+            f.write(uad.snapshot)
+    with fir.watchdog(uad.unit, fir.UNIT_TIMEOUT):
+        yield
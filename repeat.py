@@ -0,0 +1,150 @@
+import json
+import os
+
+import numpy as np
+
+import Day_5_Complete as fir
+import runner
+
+#----------------------------------
+# Constants
+#----------------------------------
+REPEATS = 5
+REPORT_FILE = "repeatability.json"
+MISSING = -1        # sample the unit did not answer
+ABSENT = -2         # sample past the end of a shorter output
+SHOW_DIVERGENT = 10 # divergent samples listed on the console
+
+#----------------------------------
+# Agreement
+#----------------------------------
+
+def replicate(jobs, n):
+    """
+    n copies of every job, told apart by their "rep" index (1-based).
+    """
+    return [dict(job, rep=k) for job in jobs for k in range(1, n + 1)]
+
+def as_matrix(outputs):
+    """
+    N output lists -> (N, samples) array padded to the longest one.
+    """
+    width = max((len(out) for out in outputs), default=0)
+    rows = np.full((len(outputs), width), ABSENT, dtype=np.int16)
+    for k, out in enumerate(outputs):
+        rows[k, :len(out)] = [MISSING if v is None else v for v in out]
+    return rows
+
+def agreement(rows):
+    """
+    Per-sample share of the repetitions that return the most common value,
+    and the indices where the repetitions do not all agree.
+    """
+    n, width = rows.shape
+    if not n or not width:
+        return np.ones(width), np.zeros(0, dtype=int)
+    ranked = np.sort(rows, axis=0)
+    same = ranked[1:] == ranked[:-1]
+    run = best = np.ones(width, dtype=int)
+    for k in range(n - 1):
+        run = np.where(same[k], run + 1, 1)
+        best = np.maximum(best, run)
+    return best / n, np.flatnonzero(best < n)
+
+def classify(reps, golden=None):
+    """
+    One record per unit x testcase cell from its repetitions: stable-pass,
+    stable-fail or flaky (error when no repetition completed). Errored
+    repetitions (hangs, infrastructure) are counted apart and take no part
+    in the agreement. TC5 outputs must also agree sample by sample to be
+    stable.
+    """
+    first = reps[0]
+    statuses = [r["status"] for r in reps]
+    completed = [r for r in reps if r["status"] != "error"]
+    record = {"unit": first["unit"], "test": first["test"], "cfg": first["cfg"], "vec": first["vec"],
+              "repeats": len(reps), "statuses": statuses, "errors": len(reps) - len(completed)}
+    divergent = []
+    outputs = [r.get("output") for r in completed]
+    if first["test"] == "tc5" and outputs and all(out is not None for out in outputs):
+        rows = as_matrix(outputs)
+        share, divergent = agreement(rows)
+        record["agreement"] = round(float(share.mean()), 4) if share.size else 1.0
+        record["divergent"] = divergent.tolist()
+        if golden:
+            padded = as_matrix(outputs + [golden])
+            record["mismatches"] = (padded[:-1] != padded[-1]).sum(axis=1).tolist()
+
+    outcomes = {r["status"] for r in completed}
+    if not completed:
+        record["class"] = "error"
+    elif len(outcomes) == 1 and not len(divergent):
+        record["class"] = f"stable-{outcomes.pop()}"
+    else:
+        record["class"] = "flaky"
+    return record
+
+#----------------------------------
+# Repeat mode
+#----------------------------------
+
+def repeat(units, tests, cfgs, vecs, n=REPEATS, backend="process", n_jobs=1):
+    """
+    Run every unit x testcase cell n times, each run on its own sandbox,
+    and classify the cells. Golden runs once per cfg/vec.
+    """
+    jobs = replicate(runner.build_matrix(units, tests, cfgs, vecs), n)
+    results, _, goldens = runner.run_matrix(jobs, backend=backend, n_jobs=n_jobs,
+                                            sandbox=True, triage=False)
+    cells = {}
+    for r in results:
+        cells.setdefault(runner.job_key(dict(r, rep=None)), []).append(r)
+    return [classify(reps, goldens.get((reps[0]["cfg"], reps[0]["vec"])))
+            for _, reps in sorted(cells.items())]
+
+def summarize(report):
+    """
+    Per-unit status for the validation report: pass/fail when every cell is
+    stable, wip while any cell is flaky, error if any cell never completed.
+    Errored repetitions are counted separately.
+    """
+    summary = {}
+    for r in report:
+        unit = summary.setdefault(r["unit"], {"stable-pass": 0, "stable-fail": 0, "flaky": 0, "error": 0,
+                                              "errored_runs": 0})
+        unit[r["class"]] += 1
+        unit["errored_runs"] += r["errors"]
+    for counts in summary.values():
+        if counts["error"]:
+            counts["status"] = "error"
+        elif counts["flaky"]:
+            counts["status"] = "wip"
+        elif counts["stable-fail"]:
+            counts["status"] = "fail"
+        else:
+            counts["status"] = "pass"
+    return summary
+
+def print_report(report, summary):
+    print("\n================= REPEATABILITY =================")
+    for r in report:
+        cell = f"{r['unit']:8} {r['test']:4}" + (f" {r['cfg']}/{r['vec']}" if r["cfg"] else "")
+        passes = r["statuses"].count("pass")
+        line = f"{cell} {r['class'].upper():12} pass {passes}/{r['repeats'] - r['errors']}"
+        if r["errors"]:
+            line += f" ({r['errors']} errored)"
+        if r.get("divergent"):
+            shown = ", ".join(str(k) for k in r["divergent"][:SHOW_DIVERGENT])
+            more = ", ..." if len(r["divergent"]) > SHOW_DIVERGENT else ""
+            line += (f", {len(r['divergent'])} divergent sample(s): {shown}{more}"
+                     f" (agreement {r['agreement']:.1%})")
+        print(line)
+    print()
+    for unit, counts in summary.items():
+        print(f"{unit:8} {counts['status'].upper():6} stable-pass={counts['stable-pass']} "
+              f"stable-fail={counts['stable-fail']} flaky={counts['flaky']} error={counts['error']} "
+              f"(errored runs {counts['errored_runs']})")
+
+def write_report(report, summary, path=None):
+    with open(path or os.path.join(fir.UNIT_FOLDER, REPORT_FILE), "w") as f:
+        json.dump({"summary": summary, "cells": report}, f, indent=1)
@@ -0,0 +1,407 @@
+import contextlib
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import Day_5_Complete as fir
+import fir_log
+import stimulus
+from scheduler import Scheduler, job_label, make_sandbox, vector_length
+
+#----------------------------------
+# Constants
+#----------------------------------
+BACKENDS = ["serial", "thread", "process"]
+
+# Testcases that do not reset the unit themselves; they get a reset+enable
+# preamble (compiled into their command plan) so every matrix cell can run
+# on its own (e.g. on another shard)
+PREAMBLE_TESTS = ["tc1", "tc3", "tc4"]
+
+log = fir_log.log
+
+#----------------------------------
+# Test matrix
+#----------------------------------
+
+def job_key(job):
+    return (job["unit"], job["test"], job["cfg"] or "", job["vec"] or "", job.get("rep") or 0)
+
+def build_matrix(units, tests, cfgs, vecs):
+    """
+    Expand unit x testcase x config into jobs. Only TC5 depends on the
+    config and vector; TC1-TC4 appear once per unit.
+    Jobs come back in a canonical order so every machine sees the same list.
+    Generated stimuli are spelled out in full (seed included).
+    """
+    vecs = [stimulus.canonical(vec) if stimulus.is_stimulus(vec) else vec for vec in vecs]
+    jobs = []
+    for unit in units:
+        for test in tests:
+            if test == "tc5":
+                for cfg in cfgs:
+                    for vec in vecs:
+                        jobs.append({"unit": unit, "test": test, "cfg": cfg, "vec": vec})
+            else:
+                jobs.append({"unit": unit, "test": test, "cfg": None, "vec": None})
+    return sorted(jobs, key=job_key)
+
+def parse_shard(text):
+    """
+    Parse "i/N" (1-based) into (i, N).
+    """
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {text!r}")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard index out of range: {text}")
+    return index, count
+
+def shard_jobs(jobs, index, count):
+    """
+    Round-robin the canonical job list over N shards; shard i keeps its share.
+    """
+    return [job for k, job in enumerate(sorted(jobs, key=job_key)) if k % count == index - 1]
+
+#----------------------------------
+# Execution
+#----------------------------------
+
+def run_job(job, por_values, goldens):
+    """
+    Run one matrix cell and return its result record.
+    """
+    unit, test = job["unit"], job["test"]
+    result = dict(job)
+    try:
+        if test == "tc5" and not goldens.get((job["cfg"], job["vec"])):
+            # An empty golden means nothing was driven: never a pass
+            raise RuntimeError("no golden output to compare against")
+        setup = fir.RESTART if test in PREAMBLE_TESTS else ()
+        if test == "tc1":
+            passed = fir.tc1_global_enable_disable(unit, setup=setup)
+        elif test == "tc2":
+            passed = fir.tc2_por(unit, por_values)
+        elif test == "tc3":
+            passed = fir.tc3_input_buffer(unit, setup=setup)
+        elif test == "tc4":
+            passed = fir.tc4_bypass(unit, setup=setup)
+        else:
+            golden = goldens[(job["cfg"], job["vec"])]
+            screen = None
+            if fir.SCREENING:
+                import screening
+                screen = result["screening"] = screening.screen(unit, job["cfg"], job["vec"], golden)
+            if screen and screen["verdict"] == "fail":
+                # A fitted model predicts the mismatch: skip the full drive and
+                # keep the prediction as the output for triage and plots
+                passed = False
+                result["output"] = screen.pop("predicted_output")
+                result["output_predicted"] = True
+            else:
+                passed, output = fir.run_tc5(unit, job["cfg"], job["vec"], golden)
+                result["output"] = output
+            if stimulus.is_stimulus(job["vec"]):
+                result["stimulus"] = stimulus.describe(job["vec"])
+        result["status"] = "pass" if passed else "fail"
+    except fir.UnitHung as e:
+        log.error(str(e))
+        result["status"] = "error"
+        result["detail"] = str(e)
+        result["quarantined"] = True
+    except Exception as e:
+        log.error(f"raised: {e}")
+        result["status"] = "error"
+        result["detail"] = str(e)
+    return result
+
+def execute(job, por_values, golden, slot=None, sandbox=False):
+    """
+    Worker entry point: run one job (optionally in a sandboxed copy of its
+    unit) and time it. Golden jobs return the golden TC5 output.
+    With a shared-memory slot (process runs), the output is written there
+    instead of being returned, and golden may be the golden run's slot.
+    Everything it logs is tagged with the job's unit and testcase.
+    """
+    start = time.perf_counter()
+    folder = recorder = None
+    with fir_log.job(job["unit"], "tc5" if job["test"] == "golden" else job["test"]), \
+            fir.job_metrics() as metrics:
+        try:
+            if slot is not None:
+                import shm_results
+                if isinstance(golden, shm_results.Slot):
+                    golden = shm_results.load(golden)
+            unit = job["unit"]
+            if sandbox:
+                unit, folder = make_sandbox(job["unit"])
+            if fir.COVERAGE and job["test"] != "golden":
+                import csr_coverage
+                recorder = csr_coverage.start(unit, por_values)
+            with fir.watchdog(unit, fir.UNIT_TIMEOUT):
+                if job["test"] == "golden":
+                    output = fir.tc5_signal_processing(unit, job["cfg"], job["vec"])
+                    if not output:
+                        raise RuntimeError(f"no output samples for {job['vec']}")
+                    result = dict(job, status="pass", output=output)
+                else:
+                    result = run_job(dict(job, unit=unit), por_values,
+                                     {(job["cfg"], job["vec"]): golden})
+                    result["unit"] = job["unit"]
+        except fir.UnitHung as e:
+            log.error(str(e))
+            result = dict(job, status="error", detail=str(e), quarantined=True)
+        except Exception as e:
+            log.error(f"raised: {e}")
+            result = dict(job, status="error", detail=str(e))
+        finally:
+            if recorder:
+                csr_coverage.stop(recorder)
+            if folder:
+                shutil.rmtree(folder, ignore_errors=True)
+    if recorder:
+        result["coverage"] = recorder.index()
+    if slot is not None and shm_results.store(slot, result.get("output")):
+        del result["output"]
+        result["shared"] = True
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    result["metrics"] = metrics
+    return result
+
+def init_worker(folder, settings, log_queue=None):
+    """
+    Process pool initializer: same unit folder and transport limits as the
+    parent; log records go back to the parent through log_queue.
+    """
+    fir.set_unit_folder(folder)
+    for name, value in settings.items():
+        setattr(fir, name, value)
+    if log_queue is not None:
+        fir_log.worker(log_queue)
+
+def golden_jobs(jobs):
+    """
+    One golden TC5 run for every (cfg, vec) pair the TC5 jobs need.
+    """
+    pairs = sorted({(job["cfg"], job["vec"]) for job in jobs if job["test"] == "tc5"})
+    return [{"unit": fir.GOLDEN, "test": "golden", "cfg": cfg, "vec": vec} for cfg, vec in pairs]
+
+def golden_label(job):
+    return job_label({"unit": fir.GOLDEN, "test": "golden", "cfg": job["cfg"], "vec": job["vec"]})
+
+def make_executor(backend, n_jobs, log_queue=None):
+    if backend == "process":
+        settings = {name: getattr(fir, name)
+                    for name in ("CMD_TIMEOUT", "CMD_RETRIES", "RETRY_BACKOFF", "UNIT_TIMEOUT",
+                                 "COVERAGE", "SCREENING")}
+        return ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker,
+                                   initargs=(fir.UNIT_FOLDER, settings, log_queue))
+    return ThreadPoolExecutor(max_workers=n_jobs)
+
+def run_matrix(jobs, backend="serial", n_jobs=1, sink=None, sandbox=False, triage=True):
+    """
+    Run the jobs with the cost-aware scheduler (golden runs included).
+    Each TC5 trace goes to the plot sink (if any) as soon as it is done.
+    Returns the result records, the schedule report and the golden outputs.
+    """
+    n_jobs = 1 if backend == "serial" else n_jobs
+    por_values = fir.load_por()
+    sched = Scheduler(golden_jobs(jobs) + jobs, n_jobs, sandbox=sandbox)
+    channel = None
+    if backend == "process" and any(job["test"] == "tc5" for job in jobs):
+        import shm_results   # numpy only for process runs with TC5
+        channel = shm_results.ResultChannel({label: vector_length(job["vec"])
+                                             for label, job in sched.jobs.items()
+                                             if job["test"] in ("tc5", "golden")})
+
+    def output(label, done):
+        r = done.get(label) or {}
+        return channel.view(label) if r.get("shared") else r.get("output")
+
+    def args_for(job, done):
+        slot = channel.slot(job_label(job)) if channel else None
+        if job["test"] != "tc5":
+            return (por_values, None, slot)
+        label = golden_label(job)
+        golden = done.get(label)
+        if golden and golden.get("shared"):
+            return (por_values, channel.slot(label), slot)
+        return (por_values, golden.get("output") if golden else None, slot)
+
+    def plot_result(label, done):
+        job = sched.jobs[label]
+        if sink is None or job["test"] != "tc5":
+            return
+        impl, golden = output(label, done), output(golden_label(job), done)
+        if impl is not None and golden is not None:
+            submit_plot(sink, job, golden, impl)
+
+    try:
+        with fir_log.listening(backend == "process") as log_queue:
+            with make_executor(backend, n_jobs, log_queue) as pool:
+                done, report = sched.run(pool, execute, args_for, on_result=plot_result)
+        # Triage and plots read the outputs straight from shared memory
+        for label, r in done.items():
+            if r.pop("shared", False):
+                r["output"] = channel.view(label)
+        results, goldens = split_results(done)
+        report_run(report)
+        if triage:
+            triage_failures(results, goldens)
+        if channel:
+            for r in done.values():
+                if "output" in r:
+                    r["output"] = shm_results.as_list(r["output"])
+            results, goldens = split_results(done)
+    finally:
+        if channel:
+            channel.close()
+    return results, report, goldens
+
+def split_results(done):
+    """
+    Scheduler results -> (sorted testcase results, golden outputs by (cfg, vec)).
+    """
+    goldens = {(r["cfg"], r["vec"]): r.get("output") for r in done.values() if r["test"] == "golden"}
+    results = sorted((r for r in done.values() if r["test"] != "golden"), key=job_key)
+    return results, goldens
+
+def report_run(report):
+    log.info(f"[SCHED] predicted makespan {report['predicted_makespan']}s "
+             f"(critical path {report['critical_path']}s), actual {report['actual_makespan']}s "
+             f"on {report['workers']} worker(s), {report['cores']} core(s)")
+    metrics = report["metrics"]
+    log.info(f"[SCHED] {metrics.get('commands', 0)} commands ({metrics.get('planned', 0)} before plan "
+             f"optimization), {metrics.get('timeouts', 0)} timeouts, {metrics.get('retries', 0)} retries")
+    for unit in report["quarantined"]:
+        log.error(f"{unit} quarantined: remaining testcases reported as errored")
+
+def triage_failures(results, goldens):
+    """
+    Attach a ranked mismatch diagnosis to every failing TC5 result.
+    numpy is only imported when there is something to triage.
+    """
+    failed = [r for r in results if r["test"] == "tc5" and r["status"] == "fail"
+              and r.get("output") is not None and goldens.get((r["cfg"], r["vec"])) is not None]
+    if not failed:
+        return
+    from triage import triage
+
+    for r in failed:
+        r["triage"] = triage(goldens[(r["cfg"], r["vec"])], r["output"],
+                             fir.read_vector(r["vec"]), fir.read_coeffs(r["cfg"]))
+        top = r["triage"]["diagnoses"][:1]
+        detail = f"{top[0]['kind']} ({top[0]['score']:.0%}): {top[0]['detail']}" if top else "unclassified"
+        log.info(f"[TRIAGE] {r['unit']} {r['cfg']}/{r['vec']}: "
+                 f"{r['triage']['mismatches']} mismatches, {detail}")
+
+def plot_sink(jobs, plot=True):
+    """
+    Plot sink for the TC5 traces of a run (a no-op context when there is
+    nothing to plot). Leave it after the results are written, so waiting
+    for the renders stays off the critical path.
+    """
+    if not plot or not any(job["test"] == "tc5" for job in jobs):
+        return contextlib.nullcontext()
+    from plotting import PlotSink, PLOT_DIR
+
+    return PlotSink(os.path.join(fir.UNIT_FOLDER, PLOT_DIR))
+
+def submit_plot(sink, job, golden, impl):
+    """
+    Queue the golden vs impl overlay of one TC5 result.
+    """
+    tag = f"_{os.path.splitext(job['cfg'])[0]}_{os.path.splitext(job['vec'])[0]}"
+    tag = re.sub(r"[^A-Za-z0-9_.-]+", "_", tag)
+    sink.submit(job["unit"], fir.read_vector(job["vec"]), golden, impl, tag=tag)
+
+#----------------------------------
+# Reports
+#----------------------------------
+
+def summarize(results):
+    """
+    Per-unit status: pass if every job passed, error if any job errored,
+    fail otherwise. Skipped jobs (pruned by coverage) do not count.
+    """
+    summary = {}
+    for r in sorted(results, key=job_key):
+        unit = summary.setdefault(r["unit"], {"pass": 0, "fail": 0, "error": 0, "skipped": 0})
+        unit[r["status"]] += 1
+    for counts in summary.values():
+        if counts["error"]:
+            counts["status"] = "error"
+        elif counts["fail"]:
+            counts["status"] = "fail"
+        else:
+            counts["status"] = "pass"
+    return summary
+
+def print_summary(summary):
+    print("\n================= SUMMARY =================")
+    for unit, counts in summary.items():
+        skipped = f" skipped={counts['skipped']}" if counts.get("skipped") else ""
+        print(f"{unit:8} {counts['status'].upper():6} "
+              f"pass={counts['pass']} fail={counts['fail']} error={counts['error']}{skipped}")
+
+def golden_records(goldens):
+    return [{"cfg": cfg, "vec": vec, "output": output}
+            for (cfg, vec), output in sorted(goldens.items())]
+
+def load_goldens(data):
+    return {(g["cfg"], g["vec"]): g["output"] for g in data.get("goldens", [])}
+
+def write_results(path, results, shard=None, schedule=None, goldens=None):
+    with open(path, "w") as f:
+        json.dump({"shard": shard, "schedule": schedule, "results": results,
+                   "goldens": golden_records(goldens or {})}, f, indent=1)
+
+def check_shards(shards, paths):
+    """
+    Raise ValueError unless the shard labels ("i/N", or None for an
+    unsharded run) cover 1..N of a single N exactly once.
+    """
+    if shards == [None]:
+        return
+    if None in shards:
+        raise ValueError(f"Unsharded result file mixed with shards: {paths[shards.index(None)]}")
+    parsed = [parse_shard(shard) for shard in shards]
+    counts = {count for _, count in parsed}
+    if len(counts) != 1:
+        raise ValueError(f"Shards of different splits: {', '.join(sorted(shards))}")
+    count = counts.pop()
+    indices = [index for index, _ in parsed]
+    for index in set(indices):
+        if indices.count(index) > 1:
+            raise ValueError(f"Shard {index}/{count} given more than once")
+    missing = sorted(set(range(1, count + 1)) - set(indices))
+    if missing:
+        raise ValueError(f"Missing shard(s) {', '.join(f'{i}/{count}' for i in missing)}")
+
+def merge_results(paths):
+    """
+    Combine per-shard result files into one report. Every shard 1..N of
+    one split must be present exactly once; missing or repeated shards and
+    duplicate cells (the same job reported by two shards) are errors.
+    """
+    shards = []
+    merged = {}
+    goldens = {}
+    for path in paths:
+        with open(path) as f:
+            data = json.load(f)
+        shards.append({"shard": data.get("shard"), "schedule": data.get("schedule")})
+        goldens.update(load_goldens(data))
+        for r in data["results"]:
+            key = job_key(r)
+            if key in merged:
+                raise ValueError(f"Job {key} reported twice (in {path})")
+            merged[key] = r
+    check_shards([s["shard"] for s in shards], paths)
+    results = [merged[key] for key in sorted(merged)]
+    return {"shards": shards, "results": results, "summary": summarize(results),
+            "goldens": golden_records(goldens)}
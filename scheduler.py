@@ -0,0 +1,276 @@
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import Day_5_Complete as fir
+import stimulus
+
+#----------------------------------
+# Constants
+#----------------------------------
+TIMINGS_FILE = "timings.json"
+SPAWN_COST = 0.05      # seconds per unit launch, until history says otherwise
+HISTORY_WEIGHT = 0.5   # weight of the newest run in the moving average
+
+#----------------------------------
+# Cost estimates
+#----------------------------------
+
+def job_label(job):
+    parts = [job["unit"], job["test"]]
+    if job["cfg"]:
+        parts += [job["cfg"], job["vec"]]
+    if job.get("rep"):
+        parts.append(f"rep={job['rep']}")
+    return "|".join(parts)
+
+def base_label(job):
+    """
+    Label without the repetition index; repetitions share timing history.
+    """
+    return job_label(dict(job, rep=None))
+
+def quarantine_label(job):
+    """
+    What a hang takes out of the run: the unit, or only one repetition of
+    it (repetitions run on their own sandbox copies).
+    """
+    return f"{job['unit']}|rep={job['rep']}" if job.get("rep") else job["unit"]
+
+def vector_length(vec_file):
+    if stimulus.is_stimulus(vec_file):
+        return stimulus.length(vec_file)
+    vec_path = os.path.join(fir.UNIT_FOLDER, vec_file)
+    if not os.path.exists(vec_path):
+        return 0
+    with open(vec_path) as f:
+        return sum(1 for line in f if line.strip())
+
+def spawn_estimate(job):
+    """
+    Number of unit executable launches a job makes (preamble included),
+    after command-plan optimization.
+    """
+    test = job["test"]
+    if test == "tc1":
+        return 1 + 3
+    if test == "tc2":
+        return 1 + 3
+    if test == "tc3":
+        return 2 + 2 + 2 * (fir.MAX_BUF + 5) + 2
+    if test == "tc4":
+        return 2 + 2 + 6
+    return 9 + vector_length(job["vec"])
+
+class Timings():
+    """
+    Per-job durations recorded by previous runs, kept in timings.json.
+    Jobs never seen before are estimated from their spawn count.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(fir.UNIT_FOLDER, TIMINGS_FILE)
+        self.seconds = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.seconds = json.load(f)
+
+    def spawn_cost(self):
+        """
+        Seconds per launch learned from history, else the default.
+        """
+        spawns = total = 0
+        for label, seconds in self.seconds.items():
+            unit, test, *rest = label.split("|")
+            job = {"unit": unit, "test": test, "cfg": rest[0] if rest else None,
+                   "vec": rest[1] if rest else None}
+            spawns += spawn_estimate(job)
+            total += seconds
+        return total / spawns if spawns else SPAWN_COST
+
+    def estimate(self, job, spawn_cost=None):
+        label = base_label(job)
+        if label in self.seconds:
+            return self.seconds[label]
+        return spawn_estimate(job) * (spawn_cost or self.spawn_cost())
+
+    def record(self, job, seconds):
+        label = base_label(job)
+        old = self.seconds.get(label)
+        self.seconds[label] = seconds if old is None else (
+            HISTORY_WEIGHT * seconds + (1 - HISTORY_WEIGHT) * old)
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump(self.seconds, f, indent=1, sort_keys=True)
+
+#----------------------------------
+# Sandboxes
+#----------------------------------
+
+def make_sandbox(unit):
+    """
+    Copy a unit executable and its .dat state into a private folder.
+    Returns the sandboxed unit name (an absolute path that get_unit_path
+    resolves as-is) and the folder to remove afterwards.
+    """
+    folder = tempfile.mkdtemp(prefix=f"{unit}_")
+    path = fir.get_unit_path(unit)
+    if path is None:
+        raise FileNotFoundError(f"Unit executable not found: {unit}")
+    shutil.copy2(path, folder)
+    dat_path = os.path.join(fir.UNIT_FOLDER, unit + ".dat")
+    if os.path.exists(dat_path):
+        shutil.copy2(dat_path, folder)
+    return os.path.join(folder, unit), folder
+
+#----------------------------------
+# Scheduler
+#----------------------------------
+
+class Scheduler():
+    """
+    Longest-processing-time-first list scheduling of unit x testcase jobs.
+
+    Jobs that share a unit's .dat file keep their canonical order (each one
+    waits for the previous job on that unit); with sandboxes they are
+    independent. TC5 jobs always wait for the golden run of their cfg/vec.
+    Priority is a job's estimate plus the longest chain waiting on it.
+    Once a job reports its unit as quarantined, the unit's remaining jobs
+    (of the same repetition) are not started and are reported as errored.
+
+    Unit launches are CPU-bound, so the makespan prediction runs at most
+    one job per core at a time, and recorded durations are scaled back to
+    one job per core.
+    """
+    def __init__(self, jobs, n_workers, sandbox=False, timings=None):
+        self.jobs = {job_label(job): job for job in jobs}
+        self.n_workers = max(1, n_workers)
+        self.cores = min(self.n_workers, os.cpu_count() or 1)
+        self.sandbox = sandbox
+        self.timings = timings or Timings()
+        self.quarantined = set()
+
+        cost = self.timings.spawn_cost()
+        self.estimate = {k: self.timings.estimate(job, cost) for k, job in self.jobs.items()}
+        self.deps = self.plan_dependencies()
+        self.priority = self.plan_priorities()
+
+    def plan_dependencies(self):
+        deps = {}
+        last = {}
+        for key, job in self.jobs.items():
+            deps[key] = []
+            if job["test"] == "tc5":
+                golden = job_label({"unit": fir.GOLDEN, "test": "golden",
+                                    "cfg": job["cfg"], "vec": job["vec"]})
+                if golden in self.jobs:
+                    deps[key].append(golden)
+            if not self.sandbox:
+                if job["unit"] in last:
+                    deps[key].append(last[job["unit"]])
+                last[job["unit"]] = key
+        return deps
+
+    def plan_priorities(self):
+        waiting_on = {key: [] for key in self.jobs}
+        for key, deps in self.deps.items():
+            for dep in deps:
+                waiting_on[dep].append(key)
+        priority = {}
+        # Dependencies always point backwards in job order
+        for key in reversed(list(self.jobs)):
+            tail = max((priority[k] for k in waiting_on[key]), default=0)
+            priority[key] = self.estimate[key] + tail
+        return priority
+
+    def ready(self, pending, done):
+        ready = [k for k in pending if all(d in done for d in self.deps[k])]
+        return sorted(ready, key=lambda k: self.priority[k], reverse=True)
+
+    def critical_path(self):
+        """
+        Longest dependency chain (per-unit order without sandboxes, golden
+        before TC5): no schedule can finish sooner.
+        """
+        return max((self.priority[k] for k in self.jobs if not self.deps[k]), default=0.0)
+
+    def predict_makespan(self):
+        """
+        Simulate the schedule with the estimated durations, dependency
+        chains included, on as many slots as there are usable cores.
+        """
+        pending = set(self.jobs)
+        done = set()
+        running = []
+        now = 0.0
+        while pending or running:
+            for key in self.ready(pending, done)[:self.cores - len(running)]:
+                pending.remove(key)
+                heapq.heappush(running, (now + self.estimate[key], key))
+            now, key = heapq.heappop(running)
+            done.add(key)
+        return now
+
+    def run(self, pool, execute, args_for, on_result=None):
+        """
+        Execute every job on the pool, highest priority first as workers free up.
+        args_for(job, results) returns the extra arguments for execute(job, ...);
+        on_result(label, results), if given, is called as each result arrives.
+        Returns results keyed by job label and the schedule report.
+        """
+        predicted = self.predict_makespan()
+        pending = set(self.jobs)
+        done = set()
+        running = {}
+        core_seconds = {}   # core time each running job got so far
+        last = time.perf_counter()
+        results = {}
+        start = time.perf_counter()
+        while pending or running:
+            for key in self.ready(pending, done)[:self.n_workers - len(running)]:
+                pending.remove(key)
+                job = self.jobs[key]
+                if quarantine_label(job) in self.quarantined:
+                    results[key] = dict(job, status="error",
+                                        detail=f"skipped: unit {quarantine_label(job)} quarantined")
+                    done.add(key)
+                    if on_result:
+                        on_result(key, results)
+                    continue
+                running[pool.submit(execute, job, *args_for(job, results), sandbox=self.sandbox)] = key
+                core_seconds[key] = 0.0
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            now = time.perf_counter()
+            share = min(1.0, self.cores / len(running))
+            for key in running.values():
+                core_seconds[key] += (now - last) * share
+            last = now
+            for fut in finished:
+                key = running.pop(fut)
+                results[key] = fut.result()
+                done.add(key)
+                if results[key].get("quarantined"):
+                    self.quarantined.add(quarantine_label(self.jobs[key]))
+                elif results[key]["status"] in ("pass", "fail") and "seconds" in results[key]:
+                    # Errored jobs stop early and would drag the history down
+                    self.timings.record(self.jobs[key], core_seconds[key])
+                if on_result:
+                    on_result(key, results)
+        actual = time.perf_counter() - start
+        self.timings.save()
+
+        metrics = {}
+        for result in results.values():
+            for name, count in result.get("metrics", {}).items():
+                metrics[name] = metrics.get(name, 0) + count
+        report = {"workers": self.n_workers, "cores": self.cores, "sandbox": self.sandbox,
+                  "predicted_makespan": round(predicted, 3), "critical_path": round(self.critical_path(), 3),
+                  "actual_makespan": round(actual, 3),
+                  "quarantined": sorted(self.quarantined), "metrics": metrics}
+        return results, report
@@ -0,0 +1,188 @@
+import itertools
+import math
+import os
+import shutil
+import threading
+
+import numpy as np
+
+import Day_5_Complete as fir
+import command_plan as cp
+import fir_log
+from fir_model import POR_HCAP, simulate, to_codes, to_signed
+from scheduler import make_sandbox
+
+#----------------------------------
+# Constants
+#----------------------------------
+TAPS = 4
+MAX_DELAY = 2           # output samples of pipeline delay the fit allows
+GAP = TAPS + MAX_DELAY  # zeros after each pulse, so responses never overlap
+ONE = 0x40              # +1.0 in Q1.6: the response is the tap weights
+QUARTER = 0x10          # +0.25: resolves weights the output cap clips
+OVERFLOWS = ("cap", "saturate", "wrap")
+RNDS = (0, 1, 2)
+
+# Impulses, bus edge values, then runs at full scale to reach the accumulator limits
+PROBE = ([ONE] + [0] * GAP + [QUARTER] + [0] * GAP
+         + sum(([v] + [0] * GAP for v in (0x7F, 0x80, 0x01, 0xFF)), [])
+         + [0x7F] * TAPS + [0] * GAP + [0x80] * TAPS + [0] * GAP)
+
+# Vectors shorter than this are cheaper to drive in full than to screen
+MIN_SAMPLES = 4 * len(PROBE)
+
+# Weight combinations tried per delay; a probe leaving more is too
+# ambiguous to screen (the worst case is 7^4, each with 9 simulations)
+MAX_WEIGHT_SETS = 64
+
+# Golden's probe fits per (folder, cfg, file stamps), see golden_models()
+GOLDEN_FITS = {}
+GOLDEN_LOCK = threading.Lock()
+
+log = fir_log.log
+
+#----------------------------------
+# Fit
+#----------------------------------
+
+def model_output(sig_in, weights, delay, rnd, overflow):
+    """
+    Output codes of a filter with the given signed tap weights, delayed by
+    delay samples (taps cleared before sample 0).
+    """
+    out = simulate(sig_in, to_codes(weights), [1] * TAPS, rnd=rnd, overflow=overflow)
+    return np.concatenate([np.zeros(delay, dtype=np.uint8), out[:len(out) - delay]])
+
+def weight_candidates(one, quarter):
+    """
+    Possible weight of one tap from its +1.0 and +0.25 impulse outputs.
+    Below the output cap the +1.0 response is the weight itself; at the
+    cap only the +0.25 response (4x coarser) bounds it.
+    """
+    cap = int(to_signed(POR_HCAP))
+    if abs(one) < cap:
+        return [one]
+    sign = 1 if one > 0 else -1
+    return [w for w in range(4 * quarter - 3, 4 * quarter + 4)
+            if -128 <= w <= 127 and sign * w >= cap]
+
+def fit(probe_out):
+    """
+    Every (weights, delay, rnd, overflow) model that reproduces the probe
+    response exactly. An empty list means the unit does not behave like
+    any FIR in the model family; None that the probe leaves more than
+    MAX_WEIGHT_SETS weight combinations to try.
+    """
+    if any(v is None for v in probe_out):
+        return []
+    observed = np.asarray(probe_out, dtype=np.uint8)
+    y = to_signed(observed)
+    quarter_at = 1 + GAP
+    models = []
+    for delay in range(MAX_DELAY + 1):
+        taps = [weight_candidates(int(y[delay + k]), int(y[quarter_at + delay + k]))
+                for k in range(TAPS)]
+        if math.prod(len(t) for t in taps) > MAX_WEIGHT_SETS:
+            return None
+        for weights in itertools.product(*taps):
+            for rnd in RNDS:
+                for overflow in OVERFLOWS:
+                    if np.array_equal(model_output(PROBE, weights, delay, rnd, overflow), observed):
+                        models.append({"weights": list(weights), "delay": delay,
+                                       "rnd": rnd, "overflow": overflow})
+    return models
+
+#----------------------------------
+# Screening
+#----------------------------------
+
+def probe(unit, cfg_file):
+    """
+    Drive the probe through the unit after TC5's reset/halt/clear/load
+    sequence; returns the output samples.
+    """
+    ops = fir.tc5_prepare(cfg_file) + [cp.drive(v, k) for k, v in enumerate(PROBE)]
+    results = fir.run_plan(unit, ops, "screen")
+    return [results[k] for k in range(len(PROBE))]
+
+def golden_models(cfg_file):
+    """
+    Models fitted to golden's probe response, probed once per process on a
+    sandbox copy (the golden unit's own state belongs to the golden runs).
+    Refitted when the golden executable or the config changes.
+    """
+    stamps = tuple(os.stat(p).st_mtime_ns if p and os.path.exists(p) else None
+                   for p in (fir.get_unit_path(fir.GOLDEN), os.path.join(fir.UNIT_FOLDER, cfg_file)))
+    key = (fir.UNIT_FOLDER, cfg_file, stamps)
+    with GOLDEN_LOCK:
+        if key not in GOLDEN_FITS:
+            unit, folder = make_sandbox(fir.GOLDEN)
+            try:
+                GOLDEN_FITS[key] = fit(probe(unit, cfg_file))
+            finally:
+                shutil.rmtree(folder, ignore_errors=True)
+        return GOLDEN_FITS[key]
+
+def predict(models, sig_in):
+    """
+    The one output every model predicts for sig_in, or None when there are
+    no models or they disagree.
+    """
+    if not models:
+        return None
+    predictions = [model_output(sig_in, m["weights"], m["delay"], m["rnd"], m["overflow"])
+                   for m in models]
+    if any(not np.array_equal(p, predictions[0]) for p in predictions[1:]):
+        return None
+    return predictions[0]
+
+def as_expected(output):
+    return np.array([-1 if v is None else v for v in output], dtype=np.int16)
+
+def screen(unit, cfg_file, vec_file, golden):
+    """
+    Predict a unit's full TC5 output from the probe and compare it with
+    golden. verdict is "fail" only when every model that fits the probe
+    predicts the same mismatching output, and the same fit on golden's
+    probe reproduces golden's real output (so the model family can
+    represent this cfg/vector); the prediction then comes back as
+    predicted_output. "pass", "ambiguous" and "unverified" mean the full
+    vector still has to be driven. None when the vector is too short to
+    be worth screening.
+    """
+    sig_in = fir.read_vector(vec_file)
+    if not sig_in or len(sig_in) < MIN_SAMPLES or not golden:
+        return None
+    expected = as_expected(golden)
+    reference = predict(golden_models(cfg_file), sig_in)
+    report = {"probe_samples": len(PROBE), "models": []}
+    if reference is None or not np.array_equal(reference.astype(np.int16), expected):
+        report["verdict"] = "unverified"
+        report["detail"] = "the fit to golden's probe does not reproduce golden's output"
+        log.info(f"[SCREEN] {report['verdict']}: {report['detail']}")
+        return report
+
+    models = fit(probe(unit, cfg_file))
+    report["models"] = (models or [])[:1]
+    predicted = predict(models, sig_in)
+    if predicted is None:
+        report["verdict"] = "ambiguous"
+        if models is None:
+            report["detail"] = f"probe leaves over {MAX_WEIGHT_SETS} weight combinations"
+        elif not models:
+            report["detail"] = "probe not explained by any FIR model"
+        else:
+            report["detail"] = f"{len(models)} models fit the probe but disagree on the vector"
+    else:
+        n = min(len(predicted), len(expected))
+        bad = np.flatnonzero(predicted[:n].astype(np.int16) != expected[:n])
+        report["mismatches"] = int(len(bad)) + abs(len(predicted) - len(expected))
+        report["verdict"] = "fail" if report["mismatches"] else "pass"
+        if report["verdict"] == "fail":
+            report["first_mismatch"] = int(bad[0]) if len(bad) else n
+            report["predicted_output"] = predicted.tolist()
+    m = report["models"][0] if report["models"] else None
+    model = (f" (taps {m['weights']}, delay {m['delay']}, rnd {m['rnd']}, {m['overflow']})"
+             if m else "")
+    log.info(f"[SCREEN] {report['verdict']}{model}")
+    return report
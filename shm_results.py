@@ -0,0 +1,140 @@
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+#----------------------------------
+# Shared-memory result channel for process-pool runs
+#
+# The parent allocates one segment per run with a slot for every TC5 and
+# golden job, sized from the vector length:
+#   uint32 header per slot   [state, samples written]
+#   uint8  samples           output codes
+#   uint8  valid             0 where the unit gave no output (None)
+# Ownership: only the parent creates, closes and unlinks the segment, in
+# a finally block, so it is gone even if workers crash. Workers attach,
+# write their slot, commit it by setting the header state last and close;
+# they never unlink. A slot a worker died in is never committed and reads
+# as "no output". If the parent itself dies, the multiprocessing resource
+# tracker unlinks the segment (on Windows it goes with the last handle).
+#----------------------------------
+
+#----------------------------------
+# Constants
+#----------------------------------
+COMMITTED = 0x46495231    # header state once a worker finished its slot
+HEADER_WORDS = 2          # state, samples written
+HEADER_BYTES = HEADER_WORDS * 4
+
+# Where a job's output lives; small enough to send with every job
+Slot = namedtuple("Slot", "segment index offset capacity")
+
+#----------------------------------
+# Slot access
+#----------------------------------
+
+def lanes(buf, slot):
+    """
+    Header, samples and valid arrays of a slot, as views on the segment.
+    """
+    head = np.ndarray(HEADER_WORDS, dtype=np.uint32, buffer=buf, offset=slot.index * HEADER_BYTES)
+    out = np.ndarray(slot.capacity, dtype=np.uint8, buffer=buf, offset=slot.offset)
+    valid = np.ndarray(slot.capacity, dtype=np.uint8, buffer=buf, offset=slot.offset + slot.capacity)
+    return head, out, valid
+
+def store(slot, output):
+    """
+    Worker side: write an output list into its slot and commit it.
+    Returns False when there is nothing to store or it does not fit; the
+    output then travels back with the result as usual.
+    """
+    if output is None or len(output) > slot.capacity:
+        return False
+    n = len(output)
+    shm = shared_memory.SharedMemory(name=slot.segment)
+    try:
+        head, out, valid = lanes(shm.buf, slot)
+        out[:n] = np.fromiter((0 if v is None else v for v in output), dtype=np.uint8, count=n)
+        valid[:n] = np.fromiter((v is not None for v in output), dtype=np.uint8, count=n)
+        head[1] = n
+        head[0] = COMMITTED
+        del head, out, valid
+    finally:
+        shm.close()
+    return True
+
+def load(slot):
+    """
+    Worker side: output list stored in a slot (e.g. the golden run), or
+    None if it was never committed.
+    """
+    shm = shared_memory.SharedMemory(name=slot.segment)
+    try:
+        head, out, valid = lanes(shm.buf, slot)
+        output = None
+        if head[0] == COMMITTED:
+            n = int(head[1])
+            output = np.ma.MaskedArray(out[:n], mask=valid[:n] == 0).tolist()
+        del head, out, valid
+    finally:
+        shm.close()
+    return output
+
+def as_list(output):
+    """
+    Output list from a slot view (None where invalid); lists pass through.
+    """
+    return output.tolist() if np.ma.isMaskedArray(output) else output
+
+#----------------------------------
+# Channel
+#----------------------------------
+
+class ResultChannel():
+    """
+    Parent-owned segment holding the outputs of one run.
+    capacities: job label -> samples to reserve.
+    Views handed out by view() must be dropped (see as_list) before close().
+    """
+    def __init__(self, capacities):
+        self.slots = {}
+        offset = len(capacities) * HEADER_BYTES
+        layout = []
+        for index, (label, capacity) in enumerate(capacities.items()):
+            layout.append((label, index, offset, capacity))
+            offset += 2 * capacity
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for label, index, slot_offset, capacity in layout:
+            self.slots[label] = Slot(self.shm.name, index, slot_offset, capacity)
+
+    def slot(self, label):
+        return self.slots.get(label)
+
+    def view(self, label):
+        """
+        Read-only masked array over a committed slot (no copy of the
+        samples), or None.
+        """
+        head, out, valid = lanes(self.shm.buf, self.slots[label])
+        if head[0] != COMMITTED:
+            return None
+        n = int(head[1])
+        samples = out[:n]
+        samples.flags.writeable = False
+        return np.ma.MaskedArray(samples, mask=valid[:n] == 0, copy=False)
+
+    def close(self):
+        if self.shm is None:
+            return
+        try:
+            self.shm.close()
+        except BufferError:
+            pass    # a view is still referenced; the mapping goes with it
+        self.shm.unlink()
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
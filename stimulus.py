@@ -0,0 +1,169 @@
+import argparse
+import math
+
+#----------------------------------
+# Constants
+#----------------------------------
+PREFIX = "gen:"
+FULL_SCALE = 64     # 1.0 in Q1.6
+
+# Feedback taps (1-based) of maximal-length Fibonacci LFSRs
+LFSR_TAPS = {7: (7, 6), 9: (9, 5), 15: (15, 14), 23: (23, 18), 31: (31, 28)}
+
+#----------------------------------
+# Helpers
+#----------------------------------
+
+def quantize(value):
+    """
+    Real value to an 8-bit Q1.6 code, saturating to [-2.0, 1.984].
+    """
+    q = max(-128, min(127, int(round(value * FULL_SCALE))))
+    return q & 0xFF
+
+def lfsr_bits(order, seed):
+    taps = LFSR_TAPS[order]
+    state = (seed or 1) & ((1 << order) - 1) or 1
+    while True:
+        bit = 0
+        for t in taps:
+            bit ^= (state >> (t - 1)) & 1
+        state = ((state << 1) | bit) & ((1 << order) - 1)
+        yield bit
+
+#----------------------------------
+# Generators
+#
+# Every generator yields n 8-bit codes lazily. seed is accepted by all of
+# them so a recorded spec always carries one, even when it is unused.
+#----------------------------------
+
+def impulse(n, amp, at, seed):
+    for k in range(n):
+        yield quantize(amp) if k == at else 0
+
+def step(n, amp, at, seed):
+    for k in range(n):
+        yield quantize(amp) if k >= at else 0
+
+def square(n, amp, period, duty, seed):
+    high, low = quantize(amp), quantize(-amp)
+    for k in range(n):
+        yield high if (k % period) < duty * period else low
+
+def sine(n, amp, freq, phase, seed):
+    for k in range(n):
+        yield quantize(amp * math.sin(2 * math.pi * freq * k + phase))
+
+def chirp(n, amp, f0, f1, seed):
+    """
+    Linear sweep from f0 to f1 (cycles/sample) over n samples.
+    """
+    rate = (f1 - f0) / max(n - 1, 1)
+    for k in range(n):
+        yield quantize(amp * math.sin(2 * math.pi * (f0 * k + rate * k * k / 2)))
+
+def prbs(n, amp, order, bits, seed):
+    """
+    LFSR sequence: bits=1 gives +/-amp, bits=8 packs 8 LFSR bits per raw code.
+    """
+    source = lfsr_bits(order, seed)
+    high, low = quantize(amp), quantize(-amp)
+    for _ in range(n):
+        if bits == 1:
+            yield high if next(source) else low
+        else:
+            code = 0
+            for _ in range(8):
+                code = (code << 1) | next(source)
+            yield code
+
+def edges(n, hold, seed):
+    """
+    Full-scale edges: alternate 0x7F (max) and 0x80 (min), each held
+    for `hold` samples.
+    """
+    for k in range(n):
+        yield 0x7F if (k // hold) % 2 == 0 else 0x80
+
+# name -> (generator, default parameters)
+STIMULI = {
+    "impulse": (impulse, {"n": 64, "amp": 1.0, "at": 0, "seed": 0}),
+    "step": (step, {"n": 64, "amp": 1.0, "at": 0, "seed": 0}),
+    "square": (square, {"n": 1024, "amp": 0.75, "period": 8, "duty": 0.5, "seed": 0}),
+    "sine": (sine, {"n": 1024, "amp": 0.9, "freq": 0.01, "phase": 0.0, "seed": 0}),
+    "chirp": (chirp, {"n": 1024, "amp": 0.9, "f0": 0.0, "f1": 0.5, "seed": 0}),
+    "prbs": (prbs, {"n": 1024, "amp": 0.75, "order": 7, "bits": 1, "seed": 1}),
+    "edges": (edges, {"n": 64, "hold": 1, "seed": 0}),
+}
+
+# parameter -> (check, what a valid value is); checked after conversion
+LIMITS = {
+    "n": (lambda v: v >= 1, "an integer >= 1"),
+    "hold": (lambda v: v >= 1, "an integer >= 1"),
+    "period": (lambda v: v >= 1, "an integer >= 1"),
+    "order": (lambda v: v in LFSR_TAPS, f"one of {', '.join(map(str, LFSR_TAPS))}"),
+    "bits": (lambda v: v in (1, 8), "1 or 8"),
+}
+
+#----------------------------------
+# Specs
+#----------------------------------
+
+def is_stimulus(vec):
+    return isinstance(vec, str) and vec.startswith(PREFIX)
+
+def parse_spec(spec):
+    """
+    "gen:sine,n=4096,freq=0.02" -> ("sine", {all parameters, defaults filled}).
+    Values are converted to the type of the default and range-checked, so
+    a bad spec fails on the command line, not in a worker.
+    Raises argparse.ArgumentTypeError.
+    """
+    name, *pairs = spec[len(PREFIX):].split(",")
+    if name not in STIMULI:
+        raise argparse.ArgumentTypeError(f"Unknown stimulus {name!r}; choose from {', '.join(STIMULI)}")
+    params = dict(STIMULI[name][1])
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        if key not in params:
+            raise argparse.ArgumentTypeError(f"Unknown parameter {key!r} for stimulus {name}")
+        kind = type(params[key])
+        check, valid = LIMITS.get(key, (lambda v: True, f"a {kind.__name__}"))
+        try:
+            params[key] = kind(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"{name} {key} must be {valid}, got {value!r}")
+        if not check(params[key]):
+            raise argparse.ArgumentTypeError(f"{name} {key} must be {valid}, got {value!r}")
+    return name, params
+
+def canonical(spec):
+    """
+    Spec with every parameter (seed included) spelled out in a fixed order,
+    so results record exactly what was driven.
+    """
+    name, params = parse_spec(spec)
+    return PREFIX + ",".join([name] + [f"{k}={v}" for k, v in sorted(params.items())])
+
+def describe(spec):
+    name, params = parse_spec(spec)
+    return {"generator": name, **params}
+
+def generate(spec):
+    """
+    Lazily yield the 8-bit codes of a stimulus spec.
+    """
+    name, params = parse_spec(spec)
+    return STIMULI[name][0](**params)
+
+def length(spec):
+    return parse_spec(spec)[1]["n"]
+
+def write_vec(spec, path):
+    """
+    Stream a stimulus into the .vec format (one hex code per line).
+    """
+    with open(path, "w") as f:
+        for code in generate(spec):
+            f.write(f"{code:#04x}\n")
@@ -0,0 +1,204 @@
+import numpy as np
+
+from fir_model import RND_MODES, simulate, to_signed
+
+#----------------------------------
+# Constants
+#----------------------------------
+MISSING = -1        # impl gave no output for a sample
+MAX_LAG = 16        # samples searched either side by the lag detector
+BIT_NAMES = [f"bit {b}" for b in range(8)]
+
+#----------------------------------
+# Helpers
+#----------------------------------
+
+def as_codes(seq):
+    """
+    Output list (ints or None) or shared-memory view to an int16 array,
+    None/masked -> MISSING.
+    """
+    if np.ma.isMaskedArray(seq):
+        return seq.astype(np.int16).filled(MISSING)
+    return np.array([MISSING if v is None else v for v in seq], dtype=np.int16)
+
+def diagnosis(kind, score, detail):
+    return {"kind": kind, "score": round(float(score), 3), "detail": detail}
+
+def match_fraction(a, b):
+    return float(np.mean(a == b)) if len(a) else 0.0
+
+#----------------------------------
+# Detectors
+#
+# Each returns a diagnosis whose score is the fraction of the mismatching
+# samples it explains (0..1), or None when it does not apply.
+#----------------------------------
+
+def detect_missing(golden, impl, bad):
+    missing = impl == MISSING
+    if not missing.any():
+        return None
+    return diagnosis("no output", missing.sum() / bad.sum(),
+                     f"{int(missing.sum())} samples returned no output")
+
+def detect_lag(golden, impl, bad):
+    """
+    Constant latency difference, found by cross-correlating the signed
+    traces and confirmed by comparing the shifted sequences.
+    """
+    n = len(golden)
+    valid = impl != MISSING
+    a = np.where(valid, to_signed(impl), 0).astype(float)
+    b = to_signed(golden).astype(float)
+    a -= a.mean()
+    b -= b.mean()
+    nfft = 1 << int(2 * max(n, MAX_LAG + 1) - 1).bit_length()
+    corr = np.fft.irfft(np.fft.rfft(a, nfft) * np.conj(np.fft.rfft(b, nfft)), nfft)
+    lags = np.r_[0:MAX_LAG + 1, -MAX_LAG:0]
+    lag = int(lags[np.argmax(corr[lags])])
+    if lag == 0 or abs(lag) >= n:
+        return None
+
+    if lag > 0:
+        shifted = match_fraction(impl[lag:], golden[:n - lag])
+    else:
+        shifted = match_fraction(impl[:n + lag], golden[-lag:])
+    if shifted <= match_fraction(impl, golden):
+        return None
+    direction = "behind" if lag > 0 else "ahead of"
+    return diagnosis("lag", shifted, f"impl output is {abs(lag)} samples {direction} golden")
+
+def detect_lsb(golden, impl, bad, model):
+    """
+    Off-by-one-LSB errors; with the filter config known, check whether
+    impl matches a different CSR.RND mode than golden. Samples without
+    output are left to detect_missing.
+    """
+    answered = bad & (impl != MISSING)
+    diff = to_signed(impl[answered]) - to_signed(golden[answered])
+    lsb = np.abs(diff) == 1
+    if not lsb.any():
+        return None
+    detail = f"{int(lsb.sum())} samples off by one LSB"
+    score = lsb.sum() / bad.sum()
+
+    if model is not None:
+        sig_in, coefs, enables = model
+        expected = {rnd: simulate(sig_in, coefs, enables, rnd) for rnd in RND_MODES}
+        golden_rnd = max(RND_MODES, key=lambda r: match_fraction(expected[r], golden))
+        explained = {rnd: match_fraction(expected[rnd][bad], impl[bad]) for rnd in RND_MODES}
+        impl_rnd = max(RND_MODES, key=lambda r: explained[r])
+        if impl_rnd != golden_rnd and explained[impl_rnd] > explained[golden_rnd]:
+            detail += (f"; impl matches RND={impl_rnd} ({RND_MODES[impl_rnd]}) on "
+                       f"{explained[impl_rnd]:.0%} of the mismatches, golden uses RND={golden_rnd} "
+                       f"({RND_MODES[golden_rnd]})")
+            score = max(score, explained[impl_rnd])
+    return diagnosis("rounding", score, detail)
+
+def detect_overflow(golden, impl, bad, model):
+    """
+    Saturation/wrap differences in the Q1.6 domain: compare impl against the
+    model with capping, full-range saturation and two's-complement wrap.
+    The modes only differ where the accumulator leaves the output range,
+    so without the filter config there is nothing to check.
+    """
+    if model is None:
+        return None
+    sig_in, coefs, enables = model
+    rnd = max(RND_MODES, key=lambda r: match_fraction(simulate(sig_in, coefs, enables, r), golden))
+    best = None
+    for overflow in ("cap", "saturate", "wrap"):
+        expected = simulate(sig_in, coefs, enables, rnd, overflow=overflow)
+        if match_fraction(expected, golden) == 1.0:
+            continue
+        score = match_fraction(expected[bad], impl[bad])
+        if score and (best is None or score > best[1]):
+            best = (overflow, score)
+    if best is None:
+        return None
+    return diagnosis("overflow", best[1],
+                     f"impl output uses '{best[0]}' overflow handling where golden differs")
+
+def detect_bits(golden, impl, bad):
+    """
+    Per-bit XOR histogram: stuck-at output bits and single flipped bits.
+    """
+    valid = impl != MISSING
+    g = golden[valid].astype(np.uint8)
+    i = impl[valid].astype(np.uint8)
+    bad = bad[valid]
+    if not bad.any():
+        return None
+    xor = np.unpackbits((g ^ i)[bad][:, None], axis=1)[:, ::-1]
+    hist = xor.sum(axis=0)
+    bit = int(np.argmax(hist))
+    share = hist[bit] / bad.sum()
+
+    impl_bit = (i >> bit) & 1
+    golden_bit = (g >> bit) & 1
+    if impl_bit.min() == impl_bit.max() and golden_bit.min() != golden_bit.max():
+        return diagnosis("stuck bit", share, f"{BIT_NAMES[bit]} stuck at {int(impl_bit[0])}")
+    single = np.mean((g ^ i)[bad] == (1 << bit))
+    if single > 0:
+        return diagnosis("flipped bit", single,
+                         f"{BIT_NAMES[bit]} flipped in {int(hist[bit])} samples "
+                         f"(XOR histogram {hist.tolist()})")
+    return None
+
+def detect_slip(golden, impl, bad):
+    """
+    A dropped or duplicated sample: after the first mismatch the streams
+    line up again when shifted by one.
+    """
+    first = int(np.argmax(bad))
+    tail = len(golden) - first - 1
+    if tail < 1:
+        return None
+    dropped = match_fraction(impl[first:first + tail], golden[first + 1:])
+    duplicated = match_fraction(impl[first + 1:], golden[first:first + tail])
+    if max(dropped, duplicated) <= match_fraction(impl[first:], golden[first:]):
+        return None
+    if dropped >= duplicated:
+        return diagnosis("dropped sample", dropped, f"sample {first} dropped, later samples shifted")
+    return diagnosis("duplicated sample", duplicated, f"sample {first} duplicated, later samples shifted")
+
+#----------------------------------
+# Triage
+#----------------------------------
+
+def triage(golden, impl, sig_in=None, coeffs=None):
+    """
+    Ranked diagnosis of a TC5 mismatch.
+    golden/impl: output lists; sig_in and coeffs ((coefs, enables) from
+    read_coeffs) enable the model-based rounding/overflow checks.
+    """
+    golden = as_codes(golden)
+    impl = as_codes(impl)
+    report = {"samples": len(golden), "diagnoses": []}
+
+    if len(impl) != len(golden):
+        report["diagnoses"].append(diagnosis(
+            "length", 1.0, f"impl returned {len(impl)} samples, golden {len(golden)}"))
+        n = min(len(impl), len(golden))
+        golden, impl = golden[:n], impl[:n]
+
+    bad = golden != impl
+    report["mismatches"] = int(bad.sum())
+    if not bad.any():
+        return report
+
+    model = None
+    if sig_in is not None and coeffs is not None:
+        model = (np.asarray(sig_in[:len(golden)]),) + tuple(coeffs)
+
+    found = [
+        detect_missing(golden, impl, bad),
+        detect_lag(golden, impl, bad),
+        detect_lsb(golden, impl, bad, model),
+        detect_overflow(golden, impl, bad, model),
+        detect_bits(golden, impl, bad),
+        detect_slip(golden, impl, bad),
+    ]
+    report["diagnoses"] += sorted((d for d in found if d), key=lambda d: d["score"], reverse=True)
+    return report